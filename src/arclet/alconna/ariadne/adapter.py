@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from contextlib import suppress
 from typing import Any, Callable, Union
 
 from graia.ariadne.app import Ariadne
@@ -15,7 +16,7 @@ from graia.broadcast.interfaces.dispatcher import DispatcherInterface
 from graia.broadcast.interrupt import Waiter
 from graia.broadcast.utilles import run_always_await
 
-from arclet.alconna import argv_config, set_default_argv_type
+from arclet.alconna import Alconna, argv_config, set_default_argv_type
 from arclet.alconna.tools.construct import FuncMounter
 from tarina import is_awaitable
 
@@ -58,22 +59,38 @@ class AlconnaAriadneAdapter(AlconnaGraiaAdapter[MessageEvent]):
 
         return FunctionWaiter(waiter, [source.__class__], block_propagation=True, priority=priority)
 
+    def tome_account(self, source: MessageEvent | None = None) -> Any:
+        with suppress(Exception):
+            return Ariadne.current().account
+
     async def lookup_source(
         self,
         interface: DispatcherInterface[MessageEvent],
         need_tome: bool = True,
-        remove_tome: bool = True
+        remove_tome: bool = True,
+        command: Alconna | None = None,
     ) -> MessageChain:
         message = await interface.lookup_param("__message_chain__", MessageChain, MessageChain("Unknown"))
-        if need_tome and not self.is_tome(message, Ariadne.current().account):
+        tome = (need_tome or remove_tome) and self.is_tome(message, Ariadne.current().account)
+        if need_tome and not tome:
+            raise ExecutionStop
+        if not self.precheck(message, command, 1 if tome and remove_tome else 0):
             raise ExecutionStop
-        if remove_tome:
+        if remove_tome and tome:
             return self.remove_tome(message, Ariadne.current().account)
         return message
 
     def source_id(self, source: MessageEvent | None = None) -> str:
         return str(source.source.id) if source else "_"
 
+    def session_id(self, source: MessageEvent) -> str:
+        return f"{source.sender.__class__.__name__}.{source.sender.id}"
+
+    def scene_id(self, source: MessageEvent) -> str:
+        if isinstance(source, GroupMessage):
+            return f"Group.{source.sender.group.id}"
+        return self.session_id(source)
+
     async def send(
         self,
         converter: TConvert,
@@ -97,7 +114,15 @@ class AlconnaAriadneAdapter(AlconnaGraiaAdapter[MessageEvent]):
             event = result.source
             arp = result.result
             if t := arp.all_matched_args.get(path, None):
-                return t.representation or (await app.get_user_profile(t.target)).nickname if isinstance(t, At) else t
+                if not isinstance(t, At):
+                    return t
+                if t.representation:
+                    return t.representation
+
+                async def _fetch():
+                    return (await app.get_user_profile(t.target)).nickname
+
+                return await self.names.get(f"{app.account}.{t.target}", _fetch)
             elif isinstance(event.sender, Friend):
                 return event.sender.nickname
             else:
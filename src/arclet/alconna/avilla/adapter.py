@@ -17,6 +17,7 @@ from graia.broadcast.interfaces.dispatcher import DispatcherInterface
 from graia.broadcast.interrupt import Waiter
 from graia.broadcast.utilles import run_always_await
 
+from arclet.alconna import Alconna
 from arclet.alconna.tools.construct import FuncMounter
 from tarina import is_awaitable
 
@@ -64,22 +65,35 @@ class AlconnaAvillaAdapter(AlconnaGraiaAdapter[AvillaMessageEvent]):
 
         return waiter  # type: ignore
 
+    def tome_account(self, source: AvillaMessageEvent | None = None) -> Any:
+        return source.context.self if source else None
+
     async def lookup_source(
         self,
         interface: DispatcherInterface[AvillaMessageEvent],
         need_tome: bool = True,
-        remove_tome: bool = True
+        remove_tome: bool = True,
+        command: Alconna | None = None,
     ) -> MessageChain:
         message = interface.event.message.content
-        if need_tome and not self.is_tome(message, interface.event.context.self):
+        tome = (need_tome or remove_tome) and self.is_tome(message, interface.event.context.self)
+        if need_tome and not tome:
+            raise ExecutionStop
+        if not self.precheck(message, command, 1 if tome and remove_tome else 0):
             raise ExecutionStop
-        if remove_tome:
+        if remove_tome and tome:
             return self.remove_tome(message, interface.event.context.self)
         return message
 
     def source_id(self, source: AvillaMessageEvent | None = None) -> str:
         return f"{source.message.id}@{source.context.account.route}" if source else "_"
 
+    def session_id(self, source: AvillaMessageEvent) -> str:
+        return source.context.client.display
+
+    def scene_id(self, source: AvillaMessageEvent) -> str:
+        return source.context.scene.display
+
     async def send(
         self,
         converter: TConvert,
@@ -99,17 +113,15 @@ class AlconnaAvillaAdapter(AlconnaGraiaAdapter[AvillaMessageEvent]):
         async def __wrapper__(ctx: Context, result: CommandResult[MessageReceived]):
             arp = result.result
             Tname = Union[str, Notice]
-            if t := arp.query[Tname](path):
-                if isinstance(t, Notice):
-                    if t.display:
-                        return t.display
-                    nick = await ctx.client.pull(Nick)
-                    return nick.nickname or nick.name
-                return t
-            else:
+            if (t := arp.query[Tname](path)) and (not isinstance(t, Notice) or t.display):
+                return t.display if isinstance(t, Notice) else t
+
+            async def _fetch():
                 nick = await ctx.client.pull(Nick)
                 return nick.nickname or nick.name
 
+            return await self.names.get(f"{ctx.self.display}|{ctx.client.display}", _fetch)
+
         return Depend(__wrapper__)
 
     def handle_listen(
@@ -7,6 +7,7 @@ from .adapter import AlconnaGraiaAdapter as AlconnaGraiaAdapter
 from .argv import BaseMessageChainArgv as BaseMessageChainArgv
 from .dispatcher import AlconnaDispatcher as AlconnaDispatcher
 from .dispatcher import AlconnaOutputMessage as AlconnaOutputMessage
+from .lazy import LazyCommand as LazyCommand
 from .model import CommandResult as CommandResult
 from .model import Header as Header
 from .model import Match as Match
@@ -3,30 +3,42 @@ from __future__ import annotations
 from abc import ABCMeta, abstractmethod
 from contextlib import suppress
 from contextvars import ContextVar
+from inspect import Parameter, signature
 from typing import Any, ClassVar, Generic, Callable
-from weakref import finalize
+from weakref import WeakKeyDictionary, finalize
 
 from graia.amnesia.message import MessageChain
+from graia.broadcast import Broadcast
 from graia.broadcast.builtin.decorators import Depend
 from graia.broadcast.entities.dispatcher import BaseDispatcher
+from graia.broadcast.exceptions import ExecutionStop
 from graia.broadcast.interfaces.dispatcher import DispatcherInterface
 from graia.broadcast.interrupt.waiter import Waiter
 
+from arclet.alconna import Alconna
 from arclet.alconna.tools.construct import FuncMounter
 
+from .cache import NameCache
 from .model import CommandResult, TConvert, TSource
+from .pipeline import SendPipeline
+from .router import CommandRouter
 
 
 __all__ = ["adapter_context", "AlconnaGraiaAdapter"]
 
 
 adapter_context: ContextVar["AlconnaGraiaAdapter"] = ContextVar("alconna_graia_adapter")
+_registry: WeakKeyDictionary[Broadcast, AlconnaGraiaAdapter] = WeakKeyDictionary()
+_accepts_command: dict[type, bool] = {}
 
 
 class AlconnaGraiaAdapter(Generic[TSource], metaclass=ABCMeta):
     __adapter_class__: ClassVar[type[AlconnaGraiaAdapter]] = None  # type: ignore
+    router: CommandRouter | None = None
+    pipeline: SendPipeline | None = None
 
     def __init__(self):
+        self.names = NameCache()
         token = adapter_context.set(self)
 
         def clr(tkn):
@@ -44,23 +56,91 @@ class AlconnaGraiaAdapter(Generic[TSource], metaclass=ABCMeta):
     def is_tome(self, message: MessageChain, account: Any) -> bool:
         ...
 
+    def remove_tome(self, message: MessageChain, account: Any) -> MessageChain:
+        """移除消息首部的 @自己; 默认不做处理"""
+        return message
+
+    def tome_account(self, source: TSource | None = None) -> Any:
+        """不经过 Broadcast 处理事件 (如 `AlconnaDispatcher.parse_many`) 时, 用于判断 @自己 的账号; 无法得知时返回 None"""
+        return None
+
     @classmethod
     def instance(cls):
         return adapter_context.get()
 
+    def bind(self, broadcast: Broadcast | None = None):
+        """
+        将该 adapter 注册为 broadcast 上的调度器使用的 adapter; 不传入 broadcast 时作为默认 adapter
+
+        同一进程中运行多个 Broadcast 实例时, 除 `AlconnaGraiaService` 所绑定的实例外,
+        其余实例通过该方法各自绑定 adapter (如 `AlconnaAriadneAdapter().bind(bcc)`)
+        """
+        if broadcast is None:
+            adapter_context.set(self)
+        else:
+            _registry[broadcast] = self
+        return self
+
+    @classmethod
+    def lookup(cls, broadcast: Broadcast | None = None) -> AlconnaGraiaAdapter:
+        """获取 broadcast 对应的 adapter, 未注册时返回默认 adapter"""
+        if broadcast is not None and (adapter := _registry.get(broadcast)) is not None:
+            return adapter
+        return adapter_context.get()
+
     @abstractmethod
     def completion_waiter(self, source: TSource, handler: Callable[[MessageChain], Any], priority: int = 15) -> Waiter:
         ...
 
+    def precheck(self, message: MessageChain, command: Alconna | None = None, offset: int = 0) -> bool:
+        """在不复制消息链的前提下判断命令头是否可能匹配
+
+        Args:
+            message (MessageChain): 原始消息链
+            command (Alconna | None): 目标命令, 为 None 时不做检查
+            offset (int): 跳过消息链开头的元素数量, 例如尚未移除的 At
+        """
+        if command is None or self.router is None:
+            return True
+        return self.router.may_match(command, message, offset)
+
     @abstractmethod
     async def lookup_source(
         self,
         interface: DispatcherInterface[TSource],
         need_tome: bool = True,
-        remove_tome: bool = True
+        remove_tome: bool = True,
+        command: Alconna | None = None,
     ) -> MessageChain:
+        """
+        获取消息链; 传入 `command` 时, 命令头必然无法匹配的消息会在复制消息链前被过滤 (抛出 ExecutionStop)
+
+        `command` 参数是可选的: 未接受该参数的 adapter 仍可使用, 调度器会在取得消息链后再做同样的过滤
+        """
         ...
 
+    async def lookup_message(
+        self,
+        interface: DispatcherInterface[TSource],
+        need_tome: bool = True,
+        remove_tome: bool = True,
+        command: Alconna | None = None,
+    ) -> MessageChain:
+        """供调度器调用的 `lookup_source`, 兼容未接受 `command` 参数的 adapter"""
+        if command is None:
+            return await self.lookup_source(interface, need_tome, remove_tome)
+        if (accepts := _accepts_command.get(type(self))) is None:
+            params = signature(type(self).lookup_source).parameters.values()
+            accepts = _accepts_command[type(self)] = any(
+                param.name == "command" or param.kind is Parameter.VAR_KEYWORD for param in params
+            )
+        if accepts:
+            return await self.lookup_source(interface, need_tome, remove_tome, command=command)
+        message = await self.lookup_source(interface, need_tome, remove_tome)
+        if not self.precheck(message, command):
+            raise ExecutionStop
+        return message
+
     @abstractmethod
     async def send(
         self,
@@ -71,12 +151,39 @@ class AlconnaGraiaAdapter(Generic[TSource], metaclass=ABCMeta):
     ) -> None:
         ...
 
+    async def deliver(
+        self,
+        converter: TConvert,
+        output_type: str,
+        output_text: str,
+        source: TSource,
+        wait: bool = False,
+    ) -> None:
+        """
+        发送输出信息; 设置了 `pipeline` 时经由其限流、去重与合并后再通过 `send` 发送
+
+        Args:
+            wait (bool): 经由 `pipeline` 发送时, 是否等待实际发送完成; 默认在进入发送队列后即返回
+        """
+        if self.pipeline is None:
+            return await self.send(converter, output_type, output_text, source)
+        await self.pipeline.submit(self, converter, output_type, output_text, source, wait)
+
     @abstractmethod
     def source_id(self, source: TSource | None = None) -> str:
         ...
 
+    def session_id(self, source: TSource) -> str:
+        """补全会话的来源标识, 同一标识同一时间只会存在一个补全会话"""
+        return self.source_id(source)
+
+    def scene_id(self, source: TSource) -> str:
+        """输出信息的发送目标 (群组、频道或私聊) 的标识, 同一标识共享发送管道中的限流与合并"""
+        return self.session_id(source)
+
     @abstractmethod
     def fetch_name(self, path: str) -> Depend:
+        """获取参数 `path` 对应的名称, 或消息发送者的名称; 需要网络请求的名称应经由 `names` 缓存"""
         ...
 
     @abstractmethod
@@ -116,9 +223,13 @@ class DefaultAdapter(AlconnaGraiaAdapter[TSource]):
         self,
         interface: DispatcherInterface[TSource],
         need_tome: bool = True,
-        remove_tome: bool = True
+        remove_tome: bool = True,
+        command: Alconna | None = None,
     ) -> MessageChain:
-        return await interface.lookup_param("__message_chain__", MessageChain, None)
+        message = await interface.lookup_param("__message_chain__", MessageChain, None)
+        if not self.precheck(message, command):
+            raise ExecutionStop
+        return message
 
     def handle_listen(
         self,
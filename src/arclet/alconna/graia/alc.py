@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from functools import partial
 from typing import Any, Callable, cast
 from tarina import init_spec
 from graia.saya.factory import BufferModifier, SchemaWrapper, buffer_modifier, factory
@@ -15,21 +16,38 @@ from arclet.alconna import (
     config,
 )
 
+from .cache import CommandCache
 from .dispatcher import AlconnaDispatcher
+from .lazy import LazyCommand, literal_heads
 from .saya import AlconnaSchema
 
 
 @factory
-def command(name: Any | None = None, headers: list[Any] | None = None) -> SchemaWrapper:
+def command(name: Any | None = None, headers: list[Any] | None = None, lazy: bool = False) -> SchemaWrapper:
+    """
+    Args:
+        name (Any | None): 命令名称, 默认为函数名
+        headers (list[Any] | None): 命令前缀
+        lazy (bool): 是否延迟到首条可能匹配的消息到来时才构造命令
+    """
     def wrapper(func: Callable, buffer: dict[str, Any]):
-        alc = Alconna(
-            name or func.__name__,
-            headers or [],
-            buffer.pop("alc_args", Args()),
-            *buffer.pop("alc_options", []),
-            meta=buffer.pop("alc_meta", CommandMeta()),
-            namespace=buffer.pop("alc_namespace", config.default_namespace),
-        )
+        _name = name or func.__name__
+        args = buffer.pop("alc_args", Args())
+        options = buffer.pop("alc_options", [])
+        _meta = buffer.pop("alc_meta", CommandMeta())
+        _namespace = buffer.pop("alc_namespace", config.default_namespace)
+        build = partial(Alconna, _name, headers or [], args, *options, meta=_meta, namespace=_namespace)
+        if lazy:
+            cmd = LazyCommand(
+                build,
+                literal_heads(_name, headers or []),
+                _namespace,
+                CommandCache.key("alc.command", _name, headers or [], args, options, _meta, _namespace.name),
+            )
+            dispatcher = AlconnaDispatcher(cmd, send_flag="reply")
+            buffer.setdefault("dispatchers", []).append(dispatcher)
+            return AlconnaSchema(dispatcher)
+        alc = build()
         buffer.setdefault("dispatchers", []).append(AlconnaDispatcher(alc, send_flag="reply"))
         return AlconnaSchema(alc)
 
@@ -5,12 +5,40 @@ from arclet.alconna.argv import Argv, set_default_argv_type, argv_config
 from graia.amnesia.message import MessageChain
 from graia.amnesia.message.element import Text
 
+_IDENTITY_HASH = (None, object.__hash__)
+
+
+def _field(value: Any, depth: int) -> Any:
+    if value is None:
+        return None
+    if value.__class__.__hash__ in _IDENTITY_HASH:
+        return _fingerprint(value, depth - 1)
+    try:
+        hash(value)
+    except TypeError:
+        return value.__class__, repr(value)
+    # 1, 1.0 与 True 相等且哈希相同, 需带上类型区分
+    return value.__class__, value
+
+
+def _fingerprint(unit: Any, depth: int = 2) -> Any:
+    """元素的结构指纹: 类型加上各字段的类型与值; 无法按内容哈希的字段会被展开, 超过深度或仍无法哈希时退化为其 repr"""
+    if unit.__class__ is str:
+        return unit
+    try:
+        fields = vars(unit)
+    except TypeError:
+        return unit.__class__, repr(unit)
+    if not depth:
+        return unit.__class__, repr(unit)
+    return (unit.__class__, *(_field(v, depth) for v in fields.values()))
+
 
 class BaseMessageChainArgv(Argv[MessageChain]):
 
     @staticmethod
     def generate_token(data: list[Any | list[str]]) -> int:
-        return hash(''.join(i.__repr__() for i in data))
+        return hash(tuple(map(_fingerprint, data)))
 
 
 set_default_argv_type(BaseMessageChainArgv)
@@ -0,0 +1,468 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import weakref
+from collections import OrderedDict
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from time import monotonic
+from typing import Any, Awaitable, Callable, Generic, Hashable, Iterator, Tuple, TypeVar
+
+from arclet.alconna import Alconna, Arparma, command_manager
+from tarina import lang
+
+from .model import CacheStats, CommandResult
+
+T = TypeVar("T")
+
+
+class ResultCache(Generic[T]):
+    """
+    以 (命令的哈希, 键) 为键的有界缓存, 用作输出缓存 (`output_cache`), 其键为当前语言与规范化后的消息文本 (见 `output_key`)
+
+    定义相同的命令共享条目; 条目超过 `max_size` 时按写入顺序淘汰最旧的条目, 写入超过 `ttl` 秒的条目视为过期
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._data: OrderedDict[tuple[int, str], tuple[float, T]] = OrderedDict()
+
+    def configure(self, max_size: int | None = None, ttl: float | None = None, stats: CacheStats | None = None):
+        """
+        Args:
+            max_size (int | None): 最大条目数
+            ttl (float | None): 条目的存活时间, 单位为秒
+            stats (CacheStats | None): 用于记录命中情况的统计对象
+        """
+        if max_size is not None:
+            self.max_size = max_size
+        if ttl is not None:
+            self.ttl = ttl
+        if stats is not None:
+            self.stats = stats
+        self._prune(monotonic())
+
+    def _prune(self, now: float):
+        deadline = now - self.ttl
+        data = self._data
+        while data:
+            stamp, _ = data[next(iter(data))]
+            if stamp > deadline:
+                break
+            data.popitem(last=False)
+            self.stats.expirations += 1
+        while len(data) > self.max_size:
+            data.popitem(last=False)
+            self.stats.evictions += 1
+
+    def get(self, command: Alconna, key: str) -> T | None:
+        item = self._data.get((command._hash, key))
+        if item is None or monotonic() - item[0] >= self.ttl:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return item[1]
+
+    def set(self, command: Alconna, key: str, value: T) -> T:
+        now = monotonic()
+        key = (command._hash, key)
+        self._data.pop(key, None)
+        self._data[key] = (now, value)
+        self._prune(now)
+        return value
+
+    def setdefault(self, command: Alconna, key: str, value: T) -> T:
+        item = self._data.get((command._hash, key))
+        if item is not None and monotonic() - item[0] < self.ttl:
+            return item[1]
+        return self.set(command, key, value)
+
+    def items(self) -> Iterator[tuple[tuple[int, str], T]]:
+        return ((key, item[1]) for key, item in self._data.items())
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class _Flight:
+    __slots__ = ("ref", "stamp", "futures")
+
+    def __init__(self, ref: Callable[[], Any], stamp: float):
+        self.ref = ref
+        self.stamp = stamp
+        self.futures: dict[int, tuple[asyncio.Future[Any], Callable[[], asyncio.Task[Any] | None]]] = {}
+
+
+def _abandon(flight: _Flight):
+    for future, _ in flight.futures.values():
+        future.cancel()
+    flight.futures.clear()
+
+
+class SingleFlight(Generic[T]):
+    """
+    以 (命令, 事件) 为键的单飞表
+
+    同一事件在同一命令上只解析一次: 首个调度器 (leader) 负责解析并写入结果, 其余调度器等待该结果.
+
+    事件以对象本身而非 id 或事件中的消息 id 标识. 可弱引用的事件在被回收 (即传播结束) 时释放其条目;
+    无法弱引用的事件由条目持有强引用, 以保证其 id 不会被复用. 两者都会在写入 `ttl` 秒后过期,
+    条目超过 `max_size` 时淘汰最旧的条目.
+
+    leader 放弃解析 (被取消或出错) 时 Future 会被取消, 等待中的调度器改为自行解析;
+    表中存在条目时, 每隔 `sweep_interval` 秒清理过期条目与 leader 已结束却未写入结果的 Future
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60.0, wait_timeout: float | None = 30.0):
+        """
+        Args:
+            max_size (int): 最大条目 (事件) 数
+            ttl (float): 条目的存活时间, 单位为秒
+            wait_timeout (float | None): 等待 leader 结果的最长时间, 单位为秒, 超时后自行解析; 为 None 时不限制
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.sweep_interval = 5.0
+        self.stats = CacheStats()
+        self._flights: OrderedDict[int, _Flight] = OrderedDict()
+        self._sweeper: asyncio.TimerHandle | None = None
+
+    def configure(self, max_size: int | None = None, ttl: float | None = None, stats: CacheStats | None = None):
+        """
+        Args:
+            max_size (int | None): 最大条目 (事件) 数
+            ttl (float | None): 条目的存活时间, 单位为秒
+            stats (CacheStats | None): 用于记录命中情况的统计对象
+        """
+        if max_size is not None:
+            self.max_size = max_size
+        if ttl is not None:
+            self.ttl = ttl
+        if stats is not None:
+            self.stats = stats
+        self._prune(monotonic())
+
+    def _prune(self, now: float):
+        deadline = now - self.ttl
+        flights = self._flights
+        while flights and flights[next(iter(flights))].stamp <= deadline:
+            _abandon(flights.popitem(last=False)[1])
+            self.stats.expirations += 1
+        while len(flights) > self.max_size:
+            _abandon(flights.popitem(last=False)[1])
+            self.stats.evictions += 1
+
+    def _release(self, key: int, ref: weakref.ref):
+        if (flight := self._flights.get(key)) is not None and flight.ref is ref:
+            _abandon(self._flights.pop(key))
+
+    def _sweep(self):
+        self._sweeper = None
+        self._prune(monotonic())
+        for flight in list(self._flights.values()):
+            for cmd_hash, (future, leader) in list(flight.futures.items()):
+                if not future.done() and ((task := leader()) is None or task.done()):
+                    future.cancel()
+                    del flight.futures[cmd_hash]
+        if self._flights:
+            self._sweeper = asyncio.get_running_loop().call_later(
+                self.sweep_interval, self._sweep, context=contextvars.Context()
+            )
+
+    def _flight(self, event: Any, now: float) -> _Flight:
+        key = id(event)
+        if (flight := self._flights.get(key)) is not None and flight.ref() is event:
+            return flight
+        try:
+            ref = weakref.ref(event, lambda r: self._release(key, r))
+        except TypeError:
+            ref = lambda: event  # noqa: E731
+        flight = self._flights[key] = _Flight(ref, now)
+        self._prune(now)
+        if self._sweeper is None:
+            # 在空白的上下文中调度, 以免定时器经由调用方的上下文持有事件
+            self._sweeper = asyncio.get_running_loop().call_later(
+                self.sweep_interval, self._sweep, context=contextvars.Context()
+            )
+        return flight
+
+    def join(self, command: Alconna, event: Any) -> tuple[asyncio.Future[T], bool]:
+        """
+        加入事件在命令上的解析
+
+        Returns:
+            tuple[asyncio.Future[T], bool]: 解析结果的 Future, 以及调用方是否为负责解析的 leader
+        """
+        flight = self._flight(event, monotonic())
+        if (item := flight.futures.get(command._hash)) is not None and not item[0].cancelled():
+            self.stats.hits += 1
+            return item[0], False
+        self.stats.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        # 只弱引用 leader 的任务: 任务的上下文中持有事件本身
+        flight.futures[command._hash] = (future, weakref.ref(asyncio.current_task()))  # type: ignore
+        return future, True
+
+    def abandon(self, command: Alconna, event: Any, future: asyncio.Future[T]):
+        """leader 放弃解析: 取消 Future, 使等待中的调度器改为自行解析"""
+        flight = self._flights.get(id(event))
+        if flight is not None and flight.ref() is event and (item := flight.futures.get(command._hash)):
+            if item[0] is future:
+                del flight.futures[command._hash]
+        future.cancel()
+
+    async def wait(self, future: asyncio.Future[T]) -> tuple[T | None, bool]:
+        """
+        等待 leader 的结果; 调用方自身被取消时照常抛出 CancelledError, 而不会取消共享的 Future
+
+        Returns:
+            tuple[T | None, bool]: 结果, 以及是否得到了结果; 为 False 时 (leader 放弃或超时) 调用方应自行解析
+        """
+        if not future.done():
+            loop = asyncio.get_running_loop()
+            waiter = loop.create_future()
+
+            def _wake(_=None):
+                if not waiter.done():
+                    waiter.set_result(None)
+
+            # 定时器与回调均在空白的上下文中调度, 以免其在超时前经由调用方的上下文持有事件
+            future.add_done_callback(_wake, context=contextvars.Context())
+            handle = None
+            if self.wait_timeout is not None:
+                handle = loop.call_later(self.wait_timeout, _wake, context=contextvars.Context())
+            try:
+                await waiter
+            finally:
+                if handle is not None:
+                    handle.cancel()
+                future.remove_done_callback(_wake)
+        if not future.done() or future.cancelled():
+            return None, False
+        return future.result(), True
+
+    def clear(self):
+        flights, self._flights = self._flights, OrderedDict()
+        for flight in flights.values():
+            _abandon(flight)
+
+    def __len__(self):
+        return len(self._flights)
+
+
+class NameCache:
+    """
+    显示名称 (昵称、群名片等) 的缓存
+
+    以账号与用户 (或 Selector) 为键, 条目超过 `max_size` 时淘汰最久未使用的条目, 写入超过 `ttl` 秒的条目视为过期;
+    同一键的并发查询只会发起一次请求, 其余查询等待其结果; 发起请求的查询被取消时, 其余查询之一会重新发起请求
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._pending: dict[str, asyncio.Future[str]] = {}
+
+    async def get(self, key: str, fetch: Callable[[], Awaitable[str]]) -> str:
+        """
+        Args:
+            key (str): 缓存键
+            fetch (Callable[[], Awaitable[str]]): 缓存未命中时获取名称的函数
+        """
+        if (item := self._data.get(key)) is not None and monotonic() - item[0] < self.ttl:
+            self._data.move_to_end(key)
+            return item[1]
+        while (pending := self._pending.get(key)) is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # 发起请求的调用方被取消时, 等待中的调用方改为重新查询, 而不是随之取消
+                if not pending.cancelled():
+                    raise
+        future = self._pending[key] = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            name = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._pending.pop(key, None)
+        self._data.pop(key, None)
+        self._data[key] = (monotonic(), name)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+        future.set_result(name)
+        return name
+
+    def invalidate(self, key: str | None = None):
+        """移除指定键的条目, 不传入时清空缓存"""
+        if key is None:
+            self._data.clear()
+        else:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+COMMAND_CACHE_VERSION = 1
+_UNSAFE_REGEX = ("$", "\\Z", "\\b", "\\B", "(?!", "(?<", "(?=")
+
+
+def _alconna_version() -> str | None:
+    try:
+        return version("arclet-alconna")
+    except PackageNotFoundError:
+        return None
+
+
+class CommandCache:
+    """
+    持久化的命令头表缓存
+
+    以命令定义的哈希为键, 保存命令构造后得到的命令头表 (纯文本命令头, 或命令头正则),
+    延迟构造的命令在重启后可直接据此过滤消息, 而无需先构造命令.
+
+    缓存文件的格式版本或 Alconna 的版本变化时, 已有的缓存整体失效
+    """
+
+    def __init__(self):
+        self._entries: dict[str, dict[str, Any]] = {}
+        self._dirty = False
+
+    @staticmethod
+    def key(*definition: Any) -> str:
+        """由命令定义计算缓存键; 定义的 repr 不稳定 (如含有内存地址) 时, 缓存只会失配而不会出错"""
+        return hashlib.sha1("\0".join(map(repr, definition)).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        return self._entries.get(key)
+
+    def record(self, key: str, command: Alconna) -> None:
+        """记录已构造命令的命令头表; 无法安全地用于预先过滤的命令头不会被记录"""
+        header = command_manager.require(command).command_header
+        if header.flag == 0:
+            entry: dict[str, Any] = {"heads": sorted(header.content)}
+        elif header.flag == 1 and not any(i in header.content.pattern for i in _UNSAFE_REGEX):
+            entry = {"pattern": header.content.pattern, "flags": header.content.flags}
+        else:
+            return
+        if self._entries.get(key) != entry:
+            self._entries[key] = entry
+            self._dirty = True
+
+    def load(self, path: str | Path) -> int:
+        """从文件加载缓存, 返回加载的条目数"""
+        try:
+            data = json.loads(Path(path).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return 0
+        if data.get("version") != COMMAND_CACHE_VERSION or data.get("alconna") != _alconna_version():
+            return 0
+        entries = data.get("entries", {})
+        for key, entry in entries.items():
+            self._entries.setdefault(key, entry)
+        return len(entries)
+
+    def dump(self, path: str | Path) -> int:
+        """将缓存原子地写入文件, 返回写入的条目数; 缓存未变化时不写入"""
+        if not self._dirty:
+            return 0
+        path = Path(path)
+        temp = path.with_name(f"{path.name}.tmp")
+        data = {"version": COMMAND_CACHE_VERSION, "alconna": _alconna_version(), "entries": self._entries}
+        temp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        os.replace(temp, path)
+        self._dirty = False
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TemplateCache:
+    """
+    按语言缓存的文本模板
+
+    以 (语言, 键) 缓存 `lang.require` 取得的模板及由模板渲染出的文本, 不同语言的条目互不影响;
+    切换语言时全部条目失效
+    """
+
+    def __init__(self):
+        self._data: dict[tuple[str, Hashable], str] = {}
+
+    def require(self, scope: str, type_: str, locale: str | None = None) -> str:
+        """
+        Args:
+            scope (str): 模板的作用域
+            type_ (str): 模板的类型
+            locale (str | None): 语言, 不传入时使用当前语言
+        """
+        key = (locale or lang.current, (scope, type_))
+        if (text := self._data.get(key)) is None:
+            text = self._data[key] = lang.require(scope, type_, locale)
+        return text
+
+    def render(self, key: Hashable, build: Callable[[str], str], locale: str | None = None) -> str:
+        """
+        Args:
+            key (Hashable): 渲染结果的键, 应包含渲染所用的全部参数
+            build (Callable[[str], str]): 以语言为参数渲染文本的函数
+            locale (str | None): 语言, 不传入时使用当前语言
+        """
+        locale = locale or lang.current
+        if (text := self._data.get((locale, key))) is None:
+            text = self._data[(locale, key)] = build(locale)
+        return text
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+TOutput = Tuple[Arparma, str, Tuple[int, ...]]
+"""输出缓存的条目, 依次为解析结果、输出文本与渲染时命令的快捷指令标记"""
+
+
+def output_key(text: str) -> str:
+    """输出缓存的键: 当前语言与规范化后的输入文本; 命令本身由 `ResultCache` 以命令的哈希区分"""
+    return f"{lang.current}\0{text}"
+
+
+def shortcut_stamp(command: Alconna) -> tuple[int, ...]:
+    """命令当前快捷指令的标记, 快捷指令增删或修改后标记随之变化"""
+    try:
+        return tuple(map(id, command_manager.get_shortcut(command).values()))
+    except ValueError:
+        return ()
+
+
+result_cache: SingleFlight[CommandResult | None] = SingleFlight()
+output_cache: ResultCache[TOutput] = ResultCache()
+command_cache = CommandCache()
+templates = TemplateCache()
+# 两者的键均包含当前语言, 切换语言后不会取得其他语言的条目; tarina 0.6.0 起可在切换时直接清空以释放旧条目
+if hasattr(lang, "callbacks"):
+    lang.callbacks.append(lambda _: output_cache.clear())
+    lang.callbacks.append(lambda _: templates.clear())
@@ -1,7 +1,16 @@
 import asyncio
 import contextlib
+import contextvars
+from collections import deque
+from dataclasses import replace
+from functools import partial
+from contextvars import ContextVar
 from atexit import register
-from typing import Any, ClassVar, Literal, get_args, Optional, TYPE_CHECKING, Dict
+from time import monotonic, perf_counter
+from typing import (
+    Any, AsyncIterable, AsyncIterator, Callable, ClassVar, Dict, FrozenSet, Iterable, Literal, Optional, Tuple,
+    TYPE_CHECKING, Type, Union, get_args
+)
 from arclet.alconna.completion import CompSession
 from arclet.alconna.core import Alconna
 from arclet.alconna.builtin import generate_duplication
@@ -10,39 +19,62 @@ from arclet.alconna.stub import ArgsStub, OptionStub, SubcommandStub
 from arclet.alconna.tools import AlconnaFormat, AlconnaString
 from graia.amnesia.message import MessageChain
 from graia.amnesia.message.element import Text
+from graia.broadcast import Broadcast
 from graia.broadcast.entities.dispatcher import BaseDispatcher
 from graia.broadcast.entities.event import Dispatchable
+from graia.broadcast.entities.listener import Listener
 from graia.broadcast.exceptions import ExecutionStop
 from graia.broadcast.interfaces.dispatcher import DispatcherInterface
-from graia.broadcast.interrupt import InterruptControl
-from tarina import generic_isinstance, generic_issubclass, lang, LRU
+from tarina import generic_isinstance, generic_issubclass
 from tarina.generic import get_origin
 from creart import it
-from arclet.alconna import Arparma, Empty, output_manager
+from arclet.alconna import Arparma, Empty, command_manager, output_manager
 from arclet.alconna.exceptions import SpecialOptionTriggered
 
+from .cache import output_cache, output_key, result_cache, shortcut_stamp, templates
+from .instrument import Instrumentation
+from .lazy import LazyCommand
 from .model import CommandResult, Header, Match, Query, CompConfig, TConvert, TSource
-from .service import AlconnaGraiaService
+from .router import CommandRouter
+from .service import AlconnaGraiaService, CtxService
+from .session import CompSessionPool, ParkedSession, completion_machine, resumed
 from .adapter import AlconnaGraiaAdapter
 
 
-result_cache: "Dict[int, LRU[str, asyncio.Future[Optional[CommandResult]]]]" = {}
-output_cache: "Dict[int, LRU[str, str]]" = {}
+TResolver = Callable[[DispatcherInterface, CommandResult], Any]
 
 
-def get_future(alc: Alconna, source: str):
-    return result_cache[alc._hash].get(source)
+_captured: "ContextVar[Optional[str]]" = ContextVar("_captured", default=None)
 
 
-def set_future(alc: Alconna, source: str):
-    return result_cache[alc._hash].setdefault(source, asyncio.Future())
+def _capture_output(text: str):
+    """命令的输出行为: 不直接发送, 而是记录于当前上下文中, 由调度器取出后处理"""
+    _captured.set(text)
+
+
+def _take_captured() -> Optional[str]:
+    """取出当前上下文中记录的输出"""
+    if (text := _captured.get()) is not None:
+        _captured.set(None)
+    return text
+
+
+def _instrumentation() -> Optional[Instrumentation]:
+    if (service := CtxService.get(None)) and service.instrumentation.enabled:
+        return service.instrumentation
+
+
+def _replay(result: Arparma, message: MessageChain) -> Arparma:
+    """以新的消息重建缓存中的解析结果"""
+    # Arparma 的构造参数在支持的 alconna 版本间有变化, 因此浅复制后替换原始消息;
+    # 其 __getattr__ 会查询解析结果, 空实例上的 copy.copy 会因此无限递归, 需直接复制 __dict__
+    arp = Arparma.__new__(Arparma)
+    arp.__dict__.update(result.__dict__)
+    arp.origin = message
+    return arp
 
 
 def clear():
-    for lru in result_cache.values():
-        lru.clear()
-    for dq in output_cache.values():
-        dq.clear()
     result_cache.clear()
     output_cache.clear()
 
@@ -93,7 +125,7 @@ class AlconnaDispatcher(BaseDispatcher):
 
     def __init__(
         self,
-        command: Alconna,
+        command: Union[Alconna, LazyCommand],
         *,
         send_flag: Literal["reply", "post", "stay"] = "reply",
         skip_for_unmatch: bool = True,
@@ -105,7 +137,7 @@ class AlconnaDispatcher(BaseDispatcher):
         """
         构造 Alconna调度器
         Args:
-            command (Alconna): Alconna实例
+            command (Alconna | LazyCommand): Alconna实例, 或在首条可能匹配的消息到来时才构造的延迟命令
             send_flag ("reply", "post", "stay"): 输出信息的发送方式
             skip_for_unmatch (bool): 当指令匹配失败时是否跳过对应的事件监听器, 默认为 True
             comp_session (CompConfig, optional): 补全会话配置, 不传入则不启用补全会话
@@ -114,17 +146,18 @@ class AlconnaDispatcher(BaseDispatcher):
         """
         super().__init__()
         self.need_tome = need_tome
-        self.command = command
         self.send_flag = send_flag
         self.skip_for_unmatch = skip_for_unmatch
         self.comp_session = comp_session
         self.converter = message_converter or self.__class__.default_send_handler
         self.remove_tome = remove_tome
-        self._interface = CompSession(self.command)
-        result_cache.setdefault(command._hash, LRU(10))
-        output_cache.setdefault(command._hash, LRU(10))
-        self._comp_help = ""
+        self._comp_hints: Optional[Tuple[str, str, str, FrozenSet[str]]] = None
         self._waiter = None
+        self._sessions = None
+        self._plans: Dict[Tuple[str, Any, bool], TResolver] = {}
+        self._duplication_type: Optional[Tuple[int, Type[Duplication]]] = None
+        self._lazy: Optional[LazyCommand] = None
+        self._bound: Optional[Tuple[Optional[Broadcast], AlconnaGraiaAdapter]] = None
         if self.comp_session is not None:
             _tab = self.comp_session.get("tab") or ".tab"
             _enter = self.comp_session.get("enter") or ".enter"
@@ -137,32 +170,21 @@ class AlconnaDispatcher(BaseDispatcher):
                 hides = {"tab", "enter", "exit"}
             hides |= disables
             if len(hides) < 3:
-                template = f"\n\n{{}}{{}}{{}}{lang.require('comp/graia', 'other')}\n"
-                self._comp_help = template.format(
-                    (lang.require("comp/graia", "tab").format(cmd=_tab) + "\n")
-                    if "tab" not in hides
-                    else "",
-                    (lang.require("comp/graia", "enter").format(cmd=_enter) + "\n")
-                    if "enter" not in hides
-                    else "",
-                    (lang.require("comp/graia", "exit").format(cmd=_exit) + "\n")
-                    if "exit" not in hides
-                    else "",
-                )
-
-            async def _(message: MessageChain):
+                self._comp_hints = (_tab, _enter, _exit, frozenset(hides))
+
+            async def _(message: MessageChain, session: CompSession):
                 msg = str(message).lstrip()
                 if msg.startswith(_exit) and "exit" not in disables:
                     if msg == _exit:
                         return False
-                    return lang.require("analyser", "param_unmatched").format(
+                    return templates.require("analyser", "param_unmatched").format(
                         target=msg.replace(_exit, "", 1)
                     )
 
                 elif msg.startswith(_enter) and "enter" not in disables:
                     if msg == _enter:
                         return True
-                    return lang.require("analyser", "param_unmatched").format(
+                    return templates.require("analyser", "param_unmatched").format(
                         target=msg.replace(_enter, "", 1)
                     )
 
@@ -171,13 +193,13 @@ class AlconnaDispatcher(BaseDispatcher):
                     try:
                         offset = int(offset)
                     except ValueError:
-                        return lang.require("analyser", "param_unmatched").format(target=offset)
+                        return templates.require("analyser", "param_unmatched").format(target=offset)
                     else:
-                        self._interface.tab(offset)
+                        session.tab(offset)
                         return (
-                            f"* {self._interface.current()}"
+                            f"* {session.current()}"
                             if hide_tabs
-                            else "\n".join(self._interface.lines())
+                            else "\n".join(session.lines())
                         )
                 else:
                     return message
@@ -186,148 +208,431 @@ class AlconnaDispatcher(BaseDispatcher):
         with contextlib.suppress(LookupError):
             self.need_tome = self.need_tome or AlconnaGraiaService.current().global_need_tome
             self.remove_tome = self.remove_tome or AlconnaGraiaService.current().global_remove_tome
+        if isinstance(command, LazyCommand):
+            self._lazy = command
+        else:
+            self._bind(command)
+
+    def _bind(self, command: Alconna):
+        self.command = command
+        self._lazy = None
+        output_manager.set_action(_capture_output, command.name)
+        if self.comp_session is not None:
+            self._sessions = CompSessionPool(
+                command,
+                self.comp_session.get("max_sessions", 64),
+                self.comp_session.get("idle_timeout", 120),
+            )
+
+    def __getattr__(self, item: str):
+        if item == "command" and (lazy := self.__dict__.get("_lazy")) is not None:
+            self._bind(lazy.build())
+            return self.command
+        raise AttributeError(f"{self.__class__.__name__!r} object has no attribute {item!r}")
+
+    @staticmethod
+    def _render_comp_help(hints: Tuple[str, str, str, FrozenSet[str]], locale: str) -> str:
+        *commands, hides = hints
+        lines = "".join(
+            templates.require("comp/graia", name, locale).format(cmd=cmd) + "\n"
+            for name, cmd in zip(("tab", "enter", "exit"), commands)
+            if name not in hides
+        )
+        return f"\n\n{lines}{templates.require('comp/graia', 'other', locale)}\n"
+
+    @property
+    def _comp_help(self) -> str:
+        """补全会话的操作提示, 按当前语言渲染, 相同配置的调度器共享渲染结果"""
+        if (hints := self._comp_hints) is None:
+            return ""
+        return templates.render(("comp_help", hints), partial(self._render_comp_help, hints))
+
+    @property
+    def deferred(self) -> bool:
+        """命令是否仍未构造"""
+        return self._lazy is not None
 
     async def handle(self, source: Optional[TSource], msg: MessageChain, adapter: AlconnaGraiaAdapter[TSource], dii: DispatcherInterface[TSource]):
-        inc = it(InterruptControl)
-        if self.comp_session is None or not source:
+        if (done := resumed.get()) is not None and done[0] is self.command:
+            return done[1]
+        if self._sessions is None or not source or dii is None:
+            return self.command.parse(msg)  # type: ignore
+        key = adapter.session_id(source)
+        if not (session := self._sessions.acquire(key)):
             return self.command.parse(msg)  # type: ignore
+        parked = False
+        # 补全会话在独立的上下文中进入, 之后的输入由其他任务处理时仍可在该上下文中确认与退出会话
+        context = contextvars.copy_context()
+        try:
+            res, text = context.run(self._enter_session, session, msg)
+            if text is not None:
+                # 会话中的输出记录于会话的上下文, 需转交给当前上下文以由 `_process` 处理
+                _captured.set(text)
+            if res:
+                return res
+            res = Arparma(self.command.path, msg, False, error_info=SpecialOptionTriggered("completion"))
+            if not session.available or not (targets := self._listeners(dii.broadcast)):
+                return res
+            waiter = adapter.completion_waiter(
+                source, lambda m: self._waiter(m, session), self.comp_session.get('priority', 10)  # type: ignore
+            )
+            state = ParkedSession(
+                self.command,
+                key,
+                session,
+                source,
+                res,
+                waiter,
+                dii.broadcast,
+                targets,
+                self.comp_session.get('timeout', 60),  # type: ignore
+                self._advance,
+                self._expire,
+                context,
+            )
+            if not (parked := completion_machine.park(state)):
+                return res
+            try:
+                await self._prompt(state, adapter)
+            except BaseException:
+                parked = False
+                completion_machine.finish(state)
+                raise
+            return res
+        finally:
+            if not parked:
+                context.run(self._sessions.release, key)
+
+    def _enter_session(self, session: CompSession, msg: MessageChain) -> Tuple[Optional[Arparma], Optional[str]]:
         res = None
-        with self._interface:
+        _captured.set(None)
+        with session:
             res = self.command.parse(msg)  # type: ignore
-        if res:
-            return res
-        res = Arparma(self.command.path, msg, False, error_info=SpecialOptionTriggered("completion"))
-        waiter = adapter.completion_waiter(source, self._waiter, self.comp_session.get('priority', 10))  # type: ignore
-        while self._interface.available:
-            await adapter.send(self.converter, "completion", f"{str(self._interface)}{self._comp_help}", source)
-            while True:
-                try:
-                    ans = await inc.wait(
-                        waiter, timeout=self.comp_session.get('timeout', 60)
-                    )
-                except asyncio.TimeoutError:
-                    await self.output(dii, adapter, res, lang.require("comp/graia", "timeout"), source)
-                    self._interface.exit()
-                    return res
-                if ans is False:
-                    await self.output(dii, adapter, res, lang.require("comp/graia", "exited"), source)
-                    self._interface.exit()
-                    return res
-                if isinstance(ans, str):
-                    await self.output(dii, adapter, res, ans, source)
-                    continue
-                _res = self._interface.enter(None if ans is True else ans)
-                if _res.result:
-                    res = _res.result
-                elif _res.exception and not isinstance(_res.exception, SpecialOptionTriggered):
-                    await self.output(dii, adapter, res, str(_res.exception), source)
-                break
-        self._interface.exit()
-        return res
+        return res, _take_captured()
+
+    def _listeners(self, broadcast: Broadcast) -> "list[Listener]":
+        """
+        获取使用该命令的全部监听器, 补全完成后会以完成的解析结果重新执行它们
+
+        监听器的注册不经过调度器, 因此只能在打开补全会话时查找; 查找只在会话打开时进行, 不影响普通消息的处理
+        """
+        return [
+            listener
+            for listener in broadcast.listeners
+            if any(
+                isinstance(dispatcher, AlconnaDispatcher) and dispatcher.__dict__.get("command") is self.command
+                for dispatcher in listener.dispatchers
+            )
+        ]
+
+    async def _prompt(self, state: ParkedSession, adapter: AlconnaGraiaAdapter[TSource]):
+        ins = _instrumentation()
+        start = perf_counter() if ins else 0.0
+        await adapter.deliver(self.converter, "completion", f"{str(state.session)}{self._comp_help}", state.source)
+        if ins:
+            ins.timing(self.command, "send", perf_counter() - start)
+
+    async def _advance(self, state: ParkedSession, ans: Any) -> Optional[Arparma]:
+        """处理补全会话中的一次输入; 返回会话结束时的解析结果, 或 None 以继续等待输入"""
+        if ins := _instrumentation():
+            ins.timing(self.command, "completion_wait", monotonic() - state.stamp)
+        self._sessions.touch(state.key)  # type: ignore
+        adapter, _ = self._resolve(state.broadcast)
+        if ans is False:
+            state.context.run(self._sessions.release, state.key)  # type: ignore
+            await self.output(None, adapter, state.result, templates.require("comp/graia", "exited"), state.source)
+            return state.result
+        if isinstance(ans, str):
+            await self.output(None, adapter, state.result, ans, state.source)
+            return
+        state.context.run(_captured.set, None)
+        _res = state.context.run(state.session.enter, None if ans is True else ans)
+        text = state.context.run(_take_captured)
+        if _res.result:
+            state.result = _res.result
+            if text is not None and not _res.result.matched:
+                await self.output(None, adapter, state.result, text, state.source)
+        elif _res.exception and not isinstance(_res.exception, SpecialOptionTriggered):
+            await self.output(None, adapter, state.result, str(_res.exception), state.source)
+        if not state.session.available:
+            state.context.run(self._sessions.release, state.key)  # type: ignore
+            return state.result
+        await self._prompt(state, adapter)
+
+    async def _expire(self, state: ParkedSession):
+        state.context.run(self._sessions.release, state.key)  # type: ignore
+        adapter, _ = self._resolve(state.broadcast)
+        await self.output(None, adapter, state.result, templates.require("comp/graia", "timeout"), state.source)
 
     async def output(
         self,
-        dii: DispatcherInterface,
+        dii: Optional[DispatcherInterface],
         adapter: AlconnaGraiaAdapter[TSource],
         result: Arparma[MessageChain],
         output_text: Optional[str] = None,
         source: Optional[TSource] = None,
+        send_flag: Optional[Literal["reply", "post", "stay"]] = None,
     ):
+        send_flag = send_flag or self.send_flag
         otype = str(result.error_info) if isinstance(result.error_info, SpecialOptionTriggered) else "error"
-        if not source or (result.matched or not output_text):
+        if result.matched or not output_text:
             return CommandResult(result, otype, None, source)
-        if self.send_flag == "stay":
+        if ins := _instrumentation():
+            ins.count(self.command, otype)
+        if send_flag == "stay":
             return CommandResult(result, otype, output_text, source)
-        if self.send_flag == "reply":
-            await adapter.send(self.converter, otype, output_text, source)
-        elif self.send_flag == "post":
-            dii.broadcast.postEvent(AlconnaOutputMessage(self.command, otype, output_text, source), source)
+        if not source:
+            return CommandResult(result, otype, None, source)
+        if send_flag == "reply":
+            start = perf_counter() if ins else 0.0
+            await adapter.deliver(self.converter, otype, output_text, source)
+            if ins:
+                ins.timing(self.command, "send", perf_counter() - start)
+        elif send_flag == "post":
+            broadcast = dii.broadcast if dii is not None else (self._bound and self._bound[0]) or it(Broadcast)
+            broadcast.postEvent(AlconnaOutputMessage(self.command, otype, output_text, source), source)
         return CommandResult(result, otype, None, source)
 
+    def _resolve(self, broadcast: Optional[Broadcast] = None) -> "tuple[AlconnaGraiaAdapter, Optional[CommandRouter]]":
+        """获取 broadcast 对应的 adapter 与路由表; 结果在首次获取后保存, 之后只需比较 broadcast"""
+        if (bound := self._bound) is None or bound[0] is not broadcast:
+            bound = self._bound = (broadcast, AlconnaGraiaAdapter.lookup(broadcast))
+        return bound[1], bound[1].router
+
+    async def _process(
+        self,
+        source: Optional[TSource],
+        message: MessageChain,
+        adapter: AlconnaGraiaAdapter[TSource],
+        dii: Optional[DispatcherInterface[TSource]],
+        send_flag: Optional[Literal["reply", "post", "stay"]] = None,
+    ) -> Optional[CommandResult]:
+        ins = _instrumentation()
+        start = perf_counter() if ins else 0.0
+        memo = None
+        if self._sessions is None or not source:
+            # 补全会话之外, 同一输入的帮助信息、快捷指令列表与报错可直接复用上次渲染的结果;
+            # 命令已从 command_manager 中移除时不使用缓存, 由下方的解析照常报错
+            with contextlib.suppress(ValueError):
+                text = CommandRouter.message_text(message, command_manager.resolve(self.command))
+                memo = None if text is None else output_key(text)
+        if memo is not None and (entry := output_cache.get(self.command, memo)) and (
+            entry[2] == shortcut_stamp(self.command)
+        ):
+            _res, may_help_text = _replay(entry[0], message), entry[1]
+        else:
+            # 清除此前 (例如在监听器之外直接调用 `parse`) 遗留在当前上下文中的输出, 以免归于本条消息
+            _captured.set(None)
+            try:
+                _res = await self.handle(source, message, adapter, dii)  # type: ignore
+            except Exception as e:
+                _res = Arparma(self.command.path, message, False, error_info=e)
+            may_help_text = _take_captured()
+        if ins:
+            ins.timing(self.command, "parse", perf_counter() - start)
+            ins.count(
+                self.command,
+                "matched" if _res.matched else "head_unmatched" if not _res.head_matched else "unmatched",
+            )
+        if not _res.head_matched:
+            return
+        if not may_help_text and not _res.matched and self.skip_for_unmatch:
+            if ins:
+                ins.count(self.command, "skipped")
+            return
+        if not may_help_text and _res.error_info:
+            may_help_text = repr(_res.error_info)
+        if memo is not None and may_help_text is not None and not _res.matched:
+            output_cache.setdefault(self.command, memo, (_res, may_help_text, shortcut_stamp(self.command)))
+        return await self.output(dii, adapter, _res, may_help_text, source, send_flag)  # type: ignore
+
+    async def parse_many(
+        self,
+        messages: "Union[Iterable[Union[MessageChain, Tuple[MessageChain, Any]]], AsyncIterable[Any]]",
+        concurrency: int = 16,
+        send: bool = False,
+        account: Any = None,
+    ) -> "AsyncIterator[Optional[CommandResult]]":
+        """
+        批量解析消息, 不经过 Broadcast 的事件分发, 用于回放消息记录或压力测试
+
+        结果按输入顺序产出; 监听器本应被跳过时产出 None.
+        与 `beforeExecution` 相同, 消息会先经过 need_tome / remove_tome 的检查与处理;
+        由于不经过 Broadcast, @自己 的判断使用 `account`, 未传入时使用 adapter 依据事件得到的账号 (`tome_account`).
+        批量解析不会打开补全会话
+
+        Args:
+            messages: 消息链, 或 (消息链, 事件) 的可迭代对象或异步可迭代对象
+            concurrency (int): 同时处理的消息数量上限
+            send (bool): 是否按 send_flag 发送输出信息, 默认为 False, 即输出信息保留在结果中
+            account (Any): 用于判断 @自己 的机器人账号
+        """
+        adapter, router = self._resolve()
+        flag = None if send else "stay"
+
+        async def _run(item) -> Optional[CommandResult]:
+            message, source = item if isinstance(item, tuple) else (item, None)
+            if self.need_tome or self.remove_tome:
+                _account = account if account is not None else adapter.tome_account(source)
+                tome = _account is not None and adapter.is_tome(message, _account)
+                if self.need_tome and not tome:
+                    if ins := _instrumentation():
+                        ins.count(self.command, "filtered")
+                    return
+                if self.remove_tome and tome:
+                    message = adapter.remove_tome(message, _account)
+            if router and not router.may_match(self.command, message):
+                if ins := _instrumentation():
+                    ins.count(self.command, "head_unmatched")
+                return
+            res = await self._process(source, message, adapter, None, flag)  # type: ignore
+            if res and (res.result.matched or res.output):
+                return res
+
+        pending: "deque[asyncio.Task[Optional[CommandResult]]]" = deque()
+        try:
+            if isinstance(messages, AsyncIterable):
+                async for item in messages:
+                    pending.append(asyncio.create_task(_run(item)))
+                    if len(pending) >= concurrency:
+                        yield await pending.popleft()
+            else:
+                for item in messages:
+                    pending.append(asyncio.create_task(_run(item)))
+                    if len(pending) >= concurrency:
+                        yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            # 调用方提前停止迭代时, 取消尚未取出的解析
+            for task in pending:
+                task.cancel()
+
     async def beforeExecution(self, interface: DispatcherInterface):
+        adapter, _ = self._resolve(interface.broadcast)
+        ins = _instrumentation()
+        start = perf_counter() if ins else 0.0
         try:
-            adapter = AlconnaGraiaService.current().get_adapter()
-        except (ValueError, LookupError, AttributeError):
-            adapter = AlconnaGraiaAdapter.instance()
-        message = await adapter.lookup_source(interface, self.need_tome, self.remove_tome)
+            if (lazy := self._lazy) is not None:
+                message = await adapter.lookup_message(interface, self.need_tome, self.remove_tome)
+                if not lazy.may_match(message):
+                    raise ExecutionStop
+            else:
+                message = await adapter.lookup_message(interface, self.need_tome, self.remove_tome, self.command)
+        except ExecutionStop:
+            if ins and self._lazy is None:
+                ins.count(self.command, "filtered")
+            raise
+        if ins:
+            ins.timing(self.command, "lookup_source", perf_counter() - start)
         try:
             source = interface.event
         except LookupError:
             source = None
-        if future := get_future(self.command, adapter.source_id(source)):
-            await future
-            if not (_property := future.result()):
-                raise ExecutionStop
+        if source is None or resumed.get() is not None:
+            # 补全完成后重新执行的监听器不经过单飞表: 表中仍是触发补全时的结果
+            _property = await self._process(source, message, adapter, interface)
         else:
-            fut = set_future(self.command, adapter.source_id(source))
-            with output_manager.capture(self.command.name) as cap:
-                output_manager.set_action(lambda x: x, self.command.name)
+            future, leader = result_cache.join(self.command, source)
+            if leader:
                 try:
-                    _res = await self.handle(source, message, adapter, interface)
-                except Exception as e:
-                    _res = Arparma(self.command.path, message, False, error_info=e)
-                may_help_text: Optional[str] = cap.get("output", None)
-            if not _res.head_matched:
-                fut.set_result(None)
-                raise ExecutionStop
-            if not may_help_text and not _res.matched and self.skip_for_unmatch:
-                fut.set_result(None)
-                raise ExecutionStop
-            if not may_help_text and _res.error_info:
-                may_help_text = repr(_res.error_info)
-            if may_help_text is not None:
-                output_cache[self.command._hash][adapter.source_id(source)] = may_help_text
-            _property = await self.output(interface, adapter, _res, may_help_text, source)
-            fut.set_result(_property)
+                    _property = await self._process(source, message, adapter, interface)
+                except BaseException:
+                    result_cache.abandon(self.command, source, future)
+                    raise
+                if not future.done():
+                    # 共享的结果不持有事件本身, 以免条目使事件无法被回收
+                    future.set_result(_property and replace(_property, source=None))
+            else:
+                shared, done = await result_cache.wait(future)
+                if done:
+                    _property = shared and replace(shared, source=source)
+                else:
+                    _property = await self._process(source, message, adapter, interface)
+        if not _property:
+            raise ExecutionStop
         if not _property.result.matched and not _property.output:
             raise ExecutionStop
         interface.local_storage["alconna_result"] = _property
         return
 
+    def _duplication(self, interface: DispatcherInterface, res: CommandResult) -> Duplication:
+        if (dup := interface.local_storage.get("alconna_duplication")) is not None:
+            return dup
+        if not self._duplication_type or self._duplication_type[0] != self.command._hash:
+            self._duplication_type = (self.command._hash, generate_duplication(self.command))
+        dup = interface.local_storage["alconna_duplication"] = self._duplication_type[1](res.result)
+        return dup
+
+    def _compile_plan(self, name: str, annotation: Any, query: bool) -> TResolver:
+        """依据参数的名称、类型与默认值选择对应的注入方式"""
+        if annotation is Duplication:
+            return self._duplication
+        if generic_issubclass(Duplication, annotation):
+            return lambda _, res: annotation(res.result)
+        if generic_issubclass(get_origin(annotation), CommandResult):
+            return lambda _, res: res
+        if annotation is ArgsStub:
+            def _args(_, res: CommandResult):
+                arg = ArgsStub(self.command.args)
+                arg.set_result(res.result.all_matched_args)
+                return arg
+            return _args
+        if annotation is OptionStub:
+            return lambda interface, res: self._duplication(interface, res).option(name)
+        if annotation is SubcommandStub:
+            return lambda interface, res: self._duplication(interface, res).subcommand(name)
+        if generic_issubclass(get_origin(annotation), Arparma):
+            return lambda _, res: res.result
+        if annotation is str and name == "output":
+            return lambda _, res: res.output
+        if generic_issubclass(annotation, Alconna):
+            return lambda _, res: self.command
+        if annotation is Header:
+            return lambda _, res: Header(res.result.header, bool(res.result.header))
+        if annotation is Match:
+            def _match(_, res: CommandResult):
+                r = res.result.all_matched_args.get(name, Empty)
+                return Match(r, r != Empty)
+            return _match
+        if get_origin(annotation) is Match:
+            target = get_args(annotation)[0]
+
+            def _generic_match(_, res: CommandResult):
+                r = res.result.all_matched_args.get(name, Empty)
+                return Match(r, generic_isinstance(r, target))
+            return _generic_match
+        if query:
+            target = get_args(annotation)[0] if get_origin(annotation) is Query else None
+
+            def _query(interface: DispatcherInterface, res: CommandResult):
+                q = Query(interface.default.path, interface.default.result)
+                result = res.result.query(q.path, Empty)
+                if annotation is Query:
+                    q.available = result != Empty
+                elif target is not None:
+                    q.available = generic_isinstance(result, target)
+                if q.available:
+                    q.result = result
+                elif interface.default.result != Empty:
+                    q.available = True
+                return q
+            return _query
+
+        def _arg(_, res: CommandResult):
+            if name in res.result.all_matched_args:
+                if generic_isinstance(res.result.all_matched_args[name], annotation):
+                    return res.result.all_matched_args[name]
+        return _arg
+
     async def catch(self, interface: DispatcherInterface):
         res: CommandResult = interface.local_storage["alconna_result"]
-        default_duplication = generate_duplication(self.command)(res.result)
-        if interface.annotation is Duplication:
-            return default_duplication
-        if generic_issubclass(Duplication, interface.annotation):
-            return interface.annotation(res.result)
-        if generic_issubclass(get_origin(interface.annotation), CommandResult):
-            return res
-        if interface.annotation is ArgsStub:
-            arg = ArgsStub(self.command.args)
-            arg.set_result(res.result.all_matched_args)
-            return arg
-        if interface.annotation is OptionStub:
-            return default_duplication.option(interface.name)
-        if interface.annotation is SubcommandStub:
-            return default_duplication.subcommand(interface.name)
-        if generic_issubclass(get_origin(interface.annotation), Arparma):
-            return res.result
-        if interface.annotation is str and interface.name == "output":
-            return res.output
-        if generic_issubclass(interface.annotation, Alconna):
-            return self.command
-        if interface.annotation is Header:
-            return Header(res.result.header, bool(res.result.header))
-        if interface.annotation is Match:
-            r = res.result.all_matched_args.get(interface.name, Empty)
-            return Match(r, r != Empty)
-        if get_origin(interface.annotation) is Match:
-            r = res.result.all_matched_args.get(interface.name, Empty)
-            return Match(r, generic_isinstance(r, get_args(interface.annotation)[0]))
-        if isinstance(interface.default, Query):
-            q = Query(interface.default.path, interface.default.result)
-            result = res.result.query(q.path, Empty)
-            if interface.annotation is Query:
-                q.available = result != Empty
-            elif get_origin(interface.annotation) is Query:
-                q.available = generic_isinstance(result, get_args(interface.annotation)[0])
-            if q.available:
-                q.result = result
-            elif interface.default.result != Empty:
-                q.available = True
-            return q
-        if interface.name in res.result.all_matched_args:
-            if generic_isinstance(res.result.all_matched_args[interface.name], interface.annotation):
-                return res.result.all_matched_args[interface.name]
-            return
+        name, annotation, default = interface.name, interface.annotation, interface.default
+        key = (name, annotation, isinstance(default, Query))
+        try:
+            plan = self._plans.get(key)
+        except TypeError:
+            return self._compile_plan(*key)(interface, res)
+        if plan is None:
+            plan = self._plans[key] = self._compile_plan(*key)
+        return plan(interface, res)
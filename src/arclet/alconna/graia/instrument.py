@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from typing import Any, Callable
+
+from arclet.alconna import Alconna
+
+TTimingHook = Callable[[str, str, float], Any]
+"""计时回调, 参数依次为命令路径、阶段名称与耗时 (秒)"""
+
+
+class Instrumentation:
+    """
+    调度热路径的观测接口
+
+    计时阶段:
+        lookup_source: 获取消息链
+        parse: 命令解析 (含补全会话)
+        send: 通过 adapter 发送输出信息
+        completion_wait: 补全会话中等待用户输入
+
+    服务在线程池中进行的缓存读写 (recover / wait / flush / compact / command_cache.load / command_cache.dump)
+    以服务的 id 作为命令路径记录
+
+    计数项:
+        filtered (在获取消息链时被过滤) / matched / unmatched / head_unmatched / skipped, 以及各输出类型 (help / shortcut / completion / error)
+
+    未启用时调度器不会进行任何计时与计数
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._hooks: list[TTimingHook] = []
+        self._counters: dict[str, dict[str, int]] = {}
+        self._timings: dict[str, dict[str, list[float]]] = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def add_hook(self, hook: TTimingHook) -> TTimingHook:
+        """添加计时回调, 可作为装饰器使用"""
+        self._hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook: TTimingHook):
+        if hook in self._hooks:
+            self._hooks.remove(hook)
+
+    def count(self, command: Alconna, kind: str):
+        counter = self._counters.setdefault(command.path, {})
+        counter[kind] = counter.get(kind, 0) + 1
+
+    def timing(self, command: Alconna | str, phase: str, elapsed: float):
+        path = command if isinstance(command, str) else command.path
+        stats = self._timings.setdefault(path, {}).setdefault(phase, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        if elapsed > stats[2]:
+            stats[2] = elapsed
+        for hook in self._hooks:
+            hook(path, phase, elapsed)
+
+    def snapshot(self) -> dict[str, Any]:
+        """获取当前计数与各阶段耗时 (次数、总耗时、最大耗时) 的副本"""
+        return {
+            "counters": {path: dict(counter) for path, counter in self._counters.items()},
+            "timings": {
+                path: {
+                    phase: {"count": int(count), "total": total, "max": maximum}
+                    for phase, (count, total, maximum) in phases.items()
+                }
+                for path, phases in self._timings.items()
+            },
+        }
+
+    def reset(self):
+        self._counters.clear()
+        self._timings.clear()
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import os
+import pickle
+import shelve
+import struct
+import threading
+import zlib
+from contextlib import suppress
+from inspect import signature
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+from arclet.alconna import command_manager
+from arclet.alconna.typing import InnerShortcutArgs
+
+_HEADER = struct.Struct("<II")
+TRecord = Tuple[str, str, int, str, Any]
+"""日志记录, 依次为操作 (set / del)、命令 ("命名空间.命令名")、表序号 (0 为原始键, 1 为正则键)、快捷指令的键与值"""
+TTable = Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]]
+
+
+def _shortcuts() -> TTable:
+    # command_manager 未提供快捷指令的变更回调, 只能直接读取其内部的快捷指令表
+    return command_manager._CommandManager__shortcuts  # type: ignore
+
+
+def _encode(value: Any) -> Any:
+    # 旧版 (1.8.12) 的 InnerShortcutArgs 没有 dump / load, 因此按 __slots__ 自行编码; 包装函数不保存
+    if isinstance(value, InnerShortcutArgs):
+        return {slot: getattr(value, slot) for slot in InnerShortcutArgs.__slots__ if slot != "wrapper"}
+    return value
+
+
+def _decode(key: str, value: Any) -> Any:
+    if not isinstance(value, dict):
+        return value
+    params = signature(InnerShortcutArgs).parameters
+    if "origin_key" in params:
+        value = {"origin_key": key, **value}
+    return InnerShortcutArgs(**{name: item for name, item in value.items() if name in params})
+
+
+def _legacy() -> TTable:
+    """读取旧版服务由 command_manager.dump_cache 整体保存的缓存"""
+    # 1.8.12 的 load_cache 读取 command_manager.cache_path (即服务配置的 manager_cache.db), 之后的版本读取工作目录下的 shortcut.db
+    for path in (Path(command_manager.cache_path), Path.cwd() / "shortcut.db"):
+        if not any(path.parent.glob(f"{path.name}*")):
+            continue
+        # 旧缓存可能由其他版本的 alconna 写入, 无法读取时放弃迁移, 不影响启动
+        with suppress(Exception), shelve.open(str(path)) as db:
+            return dict(db["shortcuts"])
+    return {}
+
+
+class ShortcutJournal:
+    """
+    快捷指令的增量持久化
+
+    由快照 (`shortcuts.snapshot`) 与追加写入的日志 (`shortcuts.log`) 组成:
+    每次 `flush` 只将上次写入后新增、修改或删除的快捷指令作为记录追加到日志末尾,
+    日志中的记录数超过 `compact_threshold` 时通过 `compact` 将当前状态原子地写为新的快照并清空日志.
+
+    每条记录带有长度与 CRC32 校验, 进程崩溃导致的不完整记录会在 `recover` 时被丢弃.
+    文件读写可在其他线程中进行, `collect` 则应在修改快捷指令的线程 (事件循环) 中调用
+    """
+
+    def __init__(self, directory: str | Path, compact_threshold: int = 1024):
+        """
+        Args:
+            directory (str | Path): 快照与日志所在的目录
+            compact_threshold (int): 触发压缩的日志记录数
+        """
+        self.directory = Path(directory)
+        self.snapshot_path = self.directory / "shortcuts.snapshot"
+        self.log_path = self.directory / "shortcuts.log"
+        self.compact_threshold = compact_threshold
+        self.records = 0
+        self._persisted: dict[tuple[str, int], dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def should_compact(self) -> bool:
+        return self.records >= self.compact_threshold
+
+    @property
+    def busy(self) -> bool:
+        """是否有正在进行的文件读写"""
+        return self._lock.locked()
+
+    def wait(self):
+        """阻塞直到正在进行的文件读写完成"""
+        with self._lock:
+            pass
+
+    def _read_log(self) -> list[TRecord]:
+        records = []
+        try:
+            data = self.log_path.read_bytes()
+        except FileNotFoundError:
+            return records
+        offset = 0
+        while offset + _HEADER.size <= len(data):
+            length, checksum = _HEADER.unpack_from(data, offset)
+            payload = data[offset + _HEADER.size: offset + _HEADER.size + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+            try:
+                records.append(pickle.loads(payload))
+            except Exception:
+                break
+            offset += _HEADER.size + length
+        if offset < len(data):
+            with self.log_path.open("r+b") as f:
+                f.truncate(offset)
+        return records
+
+    def recover(self) -> int:
+        """从快照与日志恢复快捷指令到 command_manager, 返回恢复的快捷指令数量"""
+        with self._lock:
+            return self._recover()
+
+    def _recover(self) -> int:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stored: dict[tuple[str, int], dict[str, Any]] = {}
+        try:
+            data = self.snapshot_path.read_bytes()
+        except FileNotFoundError:
+            # 尚无快照时迁移旧版的缓存, 已注册的快捷指令优先
+            data = _legacy()
+            for cmd, tables in _shortcuts().items():
+                legacy = data.setdefault(cmd, ({}, {}))
+                data[cmd] = ({**legacy[0], **tables[0]}, {**legacy[1], **tables[1]})
+        else:
+            data = pickle.loads(data)
+        for cmd, tables in data.items():
+            for index, table in enumerate(tables):
+                stored[(cmd, index)] = dict(table)
+        for op, cmd, index, key, value in self._read_log():
+            if op == "set":
+                stored.setdefault((cmd, index), {})[key] = value
+            else:
+                stored.get((cmd, index), {}).pop(key, None)
+        shortcuts = _shortcuts()
+        self._persisted = {}
+        for (cmd, index), table in stored.items():
+            if not table:
+                continue
+            target = shortcuts.setdefault(cmd, ({}, {}))[index]
+            persisted = self._persisted[(cmd, index)] = {}
+            for key, value in table.items():
+                target[key] = persisted[key] = _decode(key, value)
+        self._compact()
+        return sum(map(len, self._persisted.values()))
+
+    def collect(self) -> list[TRecord]:
+        """比较当前的快捷指令表与上次写入的状态, 得到需要追加的记录"""
+        with self._lock:
+            return self._collect()
+
+    def _collect(self) -> list[TRecord]:
+        records: list[TRecord] = []
+        current: set[tuple[str, int, str]] = set()
+        for cmd, tables in _shortcuts().items():
+            for index, table in enumerate(tables):
+                current.update((cmd, index, key) for key in table)
+                persisted = self._persisted.get((cmd, index), {})
+                records.extend(
+                    ("set", cmd, index, key, value)
+                    for key, value in table.items()
+                    if persisted.get(key) is not value
+                )
+        for (cmd, index), persisted in self._persisted.items():
+            records.extend(("del", cmd, index, key, None) for key in persisted if (cmd, index, key) not in current)
+        return records
+
+    def write(self, records: list[TRecord]) -> int:
+        """将记录追加到日志末尾并落盘, 返回写入的记录数; 写入失败时这些变更会在下次 `flush` 时重新写入"""
+        if not records:
+            return 0
+        buffer = bytearray()
+        for op, cmd, index, key, value in records:
+            payload = pickle.dumps((op, cmd, index, key, _encode(value)))
+            buffer += _HEADER.pack(len(payload), zlib.crc32(payload))
+            buffer += payload
+        with self._lock:
+            return self._append(records, buffer)
+
+    def _append(self, records: list[TRecord], buffer: bytearray) -> int:
+        with self.log_path.open("ab") as f:
+            f.write(buffer)
+            f.flush()
+            os.fsync(f.fileno())
+        for op, cmd, index, key, value in records:
+            if op == "set":
+                self._persisted.setdefault((cmd, index), {})[key] = value
+            elif (persisted := self._persisted.get((cmd, index))) is not None:
+                persisted.pop(key, None)
+                if not persisted:
+                    del self._persisted[(cmd, index)]
+        self.records += len(records)
+        return len(records)
+
+    def flush(self) -> int:
+        """写入上次写入后的全部变更, 返回写入的记录数"""
+        return self.write(self.collect())
+
+    def compact(self):
+        """将已写入的状态原子地保存为快照, 并清空日志"""
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        data: dict[str, tuple[dict[str, Any], dict[str, Any]]] = {}
+        for (cmd, index), table in self._persisted.items():
+            data.setdefault(cmd, ({}, {}))[index].update((key, _encode(value)) for key, value in table.items())
+        temp = self.snapshot_path.with_name(f"{self.snapshot_path.name}.tmp")
+        with temp.open("wb") as f:
+            pickle.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.snapshot_path)
+        with self.log_path.open("wb") as f:
+            os.fsync(f.fileno())
+        self.records = 0
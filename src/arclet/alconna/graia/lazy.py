@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import re
+from typing import Any, Callable, Iterable
+
+from arclet.alconna import Alconna, CommandMeta, Namespace, config
+from arclet.alconna.argv import Argv, __argv_type__
+
+from .cache import command_cache
+from .router import CommandRouter
+
+_SPECIAL_CHARS = frozenset(".^$*+?{}[]\\|()<>:")
+_ARGVS: dict[tuple[str, type[Argv]], Argv] = {}
+
+
+def _argv(namespace: Namespace) -> Argv:
+    argv_type = __argv_type__.get(namespace.name, __argv_type__["_"])  # type: ignore
+    if (argv := _ARGVS.get((namespace.name, argv_type))) is None:
+        argv = _ARGVS[(namespace.name, argv_type)] = argv_type(CommandMeta(), namespace, "".join(namespace.separators))
+    return argv
+
+
+def literal_heads(
+    name: Any, prefixes: Iterable[Any] | None = (), namespace: Namespace | None = None
+) -> tuple[str, ...] | None:
+    """
+    计算命令可能的纯文本命令头; 命令名或前缀中存在非文本或特殊字符时返回 None
+
+    Args:
+        name (Any): 命令名
+        prefixes (Iterable[Any] | None): 命令前缀; 为 None 时如同 Alconna 一般使用命名空间的默认前缀
+        namespace (Namespace | None): 命令所属的命名空间, 默认为当前的默认命名空间
+    """
+    if not isinstance(name, str) or not name or not _SPECIAL_CHARS.isdisjoint(name):
+        return
+    if prefixes is None:
+        prefixes = (namespace or config.default_namespace).prefixes
+    heads = []
+    for prefix in prefixes:
+        if not isinstance(prefix, str) or not _SPECIAL_CHARS.isdisjoint(prefix):
+            return
+        heads.append(f"{prefix}{name}")
+    return tuple(heads) or (name,)
+
+
+def string_heads(command: str, namespace: Namespace | None = None) -> tuple[str, ...] | None:
+    """计算 AlconnaString 形式命令 (如 `[!|/]echo <content:str>`) 的纯文本命令头; 未写明前缀时使用命名空间的默认前缀"""
+    head = command.split(" ", 1)[0]
+    prefixes = None
+    if mat := re.match(r"^\[(.+?)]", head):
+        prefixes = mat[1].split("|")
+        head = head[mat.end():]
+    return literal_heads(head.lstrip(), prefixes, namespace)
+
+
+class LazyCommand:
+    """
+    延迟构造的命令
+
+    持有命令的构造函数与纯文本命令头, 在首条命令头可能匹配的消息到来时才构造 Alconna 并注册到 command_manager.
+
+    命令头无法以纯文本表示时, 若给出了 `key` 则尝试使用命令缓存中上次构造时记录的命令头表,
+    否则命令会在首条消息到来时构造;
+    仅通过快捷指令 (shortcut) 触发的命令在构造之前无法被匹配
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Alconna],
+        heads: tuple[str, ...] | None = None,
+        namespace: str | Namespace | None = None,
+        key: str | None = None,
+    ):
+        """
+        Args:
+            factory (Callable[[], Alconna]): 命令的构造函数
+            heads (tuple[str, ...] | None): 命令头的全部纯文本形式, 为 None 时不做预先过滤
+            namespace (str | Namespace | None): 命令所属的命名空间, 决定消息的文本化规则
+            key (str | None): 命令定义的缓存键, 见 `CommandCache.key`
+        """
+        self.factory = factory
+        self.heads = heads
+        self.pattern: re.Pattern[str] | None = None
+        self.key = key
+        self._pending = key is not None and heads is None
+        if namespace is None:
+            namespace = config.default_namespace
+        elif isinstance(namespace, str):
+            namespace = config.namespaces.get(namespace) or Namespace(namespace)
+        self.namespace = namespace
+
+    def _from_cache(self):
+        self._pending = False
+        if not (entry := command_cache.get(self.key)):  # type: ignore
+            return
+        if heads := entry.get("heads"):
+            self.heads = tuple(heads)
+        elif pattern := entry.get("pattern"):
+            self.pattern = re.compile(pattern, entry.get("flags", 0))
+
+    def may_match(self, message: Any) -> bool:
+        """判断命令头是否可能匹配该消息; 返回 False 时命令必然无法匹配"""
+        if self._pending:
+            self._from_cache()
+        if (self.heads is None and self.pattern is None) or not isinstance(getattr(message, "content", None), list):
+            return True
+        if not (text := CommandRouter.head_text(message, _argv(self.namespace))):
+            return False
+        if self.heads is not None:
+            return text.startswith(self.heads)
+        return self.pattern.match(text) is not None  # type: ignore
+
+    def build(self) -> Alconna:
+        command = self.factory()
+        if self.key is not None:
+            command_cache.record(self.key, command)
+        return command
@@ -59,6 +59,26 @@ class CommandResult(Generic[TSource]):
     source: TSource | None = field(default=None)
 
 
+@dataclass
+class CacheStats:
+    """解析结果缓存的命中统计"""
+    hits: int = field(default=0)
+    misses: int = field(default=0)
+    evictions: int = field(default=0)
+    expirations: int = field(default=0)
+
+
+@dataclass
+class CompletionInfo:
+    """挂起中的补全会话"""
+    command: str
+    session: str
+    age: float
+    """会话已存在的时长, 单位为秒"""
+    idle: float
+    """会话上次活动至今的时长, 单位为秒"""
+
+
 @dataclass
 class Header:
     """
@@ -82,3 +102,16 @@ class CompConfig(TypedDict):
     hides: NotRequired[Set[Literal["tab", "enter", "exit"]]]
     disables: NotRequired[Set[Literal["tab", "enter", "exit"]]]
     lite: NotRequired[bool]
+    max_sessions: NotRequired[int]
+    idle_timeout: NotRequired[float]
+
+
+class SendConfig(TypedDict):
+    rate: NotRequired[float]
+    burst: NotRequired[int]
+    dedup_window: NotRequired[float]
+    dedup_types: NotRequired[Set[OutType]]
+    coalesce_delay: NotRequired[float]
+    max_batch: NotRequired[int]
+    separator: NotRequired[str]
+    max_queue: NotRequired[int]
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from time import monotonic
+from typing import TYPE_CHECKING, Any, Optional, Tuple
+
+from loguru import logger
+
+from .model import SendConfig, TConvert
+
+if TYPE_CHECKING:
+    from .adapter import AlconnaGraiaAdapter
+
+TItem = Tuple[TConvert, str, str, Any, Optional["asyncio.Future[bool]"]]
+
+
+class _Scene:
+    __slots__ = ("tokens", "stamp", "queue", "task")
+
+    def __init__(self, tokens: float, stamp: float):
+        self.tokens = tokens
+        self.stamp = stamp
+        self.queue: list[TItem] = []
+        self.task: asyncio.Task[None] | None = None
+
+
+class SendPipeline:
+    """
+    按场景 (群组、频道或私聊, 见 `AlconnaGraiaAdapter.scene_id`) 发送输出信息的管道
+
+    每个场景持有一个令牌桶, 令牌以每秒 `rate` 个的速度恢复, 至多积累 `burst` 个, 每发送一条消息消耗一个令牌;
+    等待发送期间到达同一场景的输出会被合并为一条消息 (至多 `max_batch` 条, 以 `separator` 连接);
+    `dedup_window` 秒内同一场景中内容相同的输出 (仅限 `dedup_types` 中的类型) 只发送一次;
+    每个场景至多积压 `max_queue` 条输出, 超出时丢弃最早的输出
+    """
+
+    max_scenes = 1024
+
+    def __init__(self, config: SendConfig | None = None):
+        """
+        Args:
+            config (SendConfig | None): 发送配置, 不传入时使用默认值
+        """
+        config = config or {}
+        self.rate = config.get("rate", 1.0)
+        self.burst = config.get("burst", 5)
+        self.dedup_window = config.get("dedup_window", 10.0)
+        self.dedup_types = config.get("dedup_types", {"help", "shortcut", "error"})
+        self.coalesce_delay = config.get("coalesce_delay", 0.1)
+        self.max_batch = config.get("max_batch", 5)
+        self.separator = config.get("separator", "\n\n")
+        self.max_queue = config.get("max_queue", 20)
+        self.dropped = 0
+        self.coalesced = 0
+        self._scenes: dict[str, _Scene] = {}
+        self._recent: OrderedDict[tuple[str, str], float] = OrderedDict()
+
+    def _duplicated(self, scene: str, text: str, now: float) -> bool:
+        recent = self._recent
+        deadline = now - self.dedup_window
+        while recent and next(iter(recent.values())) <= deadline:
+            recent.popitem(last=False)
+        if (scene, text) in recent:
+            return True
+        recent[(scene, text)] = now
+        return False
+
+    def _refill(self, scene: _Scene, now: float):
+        scene.tokens = min(self.burst, scene.tokens + (now - scene.stamp) * self.rate)
+        scene.stamp = now
+
+    def _prune(self, now: float):
+        for key, scene in list(self._scenes.items()):
+            if scene.task is None:
+                self._refill(scene, now)
+                if scene.tokens >= self.burst:
+                    del self._scenes[key]
+
+    async def _acquire(self, scene: _Scene):
+        if self.rate <= 0:
+            return
+        while True:
+            self._refill(scene, monotonic())
+            if scene.tokens >= 1:
+                scene.tokens -= 1
+                return
+            await asyncio.sleep((1 - scene.tokens) / self.rate)
+
+    async def _drain(self, adapter: AlconnaGraiaAdapter, scene: _Scene):
+        queue = scene.queue
+        try:
+            while queue:
+                if self.coalesce_delay > 0:
+                    await asyncio.sleep(self.coalesce_delay)
+                await self._acquire(scene)
+                converter, output_type, _, source, _ = queue[0]
+                size = 1
+                while size < min(len(queue), self.max_batch) and queue[size][0] is converter:
+                    size += 1
+                batch = queue[:size]
+                del queue[:size]
+                self.coalesced += size - 1
+                text = self.separator.join(item[2] for item in batch)
+                try:
+                    await adapter.send(converter, output_type, text, source)
+                except Exception as e:
+                    futures = [future for *_, future in batch if future is not None and not future.done()]
+                    if not futures:
+                        logger.opt(exception=e).warning(f"failed to send {output_type} output")
+                    for future in futures:
+                        future.set_exception(e)
+                else:
+                    for *_, future in batch:
+                        if future is not None and not future.done():
+                            future.set_result(True)
+        finally:
+            scene.task = None
+            for *_, future in queue:
+                if future is not None:
+                    future.cancel()
+            queue.clear()
+
+    async def submit(
+        self,
+        adapter: AlconnaGraiaAdapter,
+        converter: TConvert,
+        output_type: str,
+        output_text: str,
+        source: Any,
+        wait: bool = False,
+    ) -> bool:
+        """
+        提交一条输出信息, 在其进入发送队列后即返回
+
+        Args:
+            wait (bool): 是否等待其 (可能与其他输出合并后) 发送完成再返回; 为真时发送失败的异常会在此抛出
+
+        Returns:
+            bool: 输出是否被接受; 被去重丢弃时为 False, 等待发送时还包括因积压过多而被丢弃的情况
+        """
+        key = adapter.scene_id(source)
+        now = monotonic()
+        if self.dedup_window > 0 and output_type in self.dedup_types and self._duplicated(key, output_text, now):
+            self.dropped += 1
+            return False
+        if (scene := self._scenes.get(key)) is None:
+            if len(self._scenes) >= self.max_scenes:
+                self._prune(now)
+            scene = self._scenes[key] = _Scene(self.burst, now)
+        future = asyncio.get_running_loop().create_future() if wait else None
+        scene.queue.append((converter, output_type, output_text, source, future))
+        if (overflow := len(scene.queue) - self.max_queue) > 0:
+            for *_, stale in scene.queue[:overflow]:
+                if stale is not None and not stale.done():
+                    stale.set_result(False)
+            del scene.queue[:overflow]
+            self.dropped += overflow
+        if scene.task is None:
+            scene.task = asyncio.create_task(self._drain(adapter, scene))
+        if future is not None:
+            return await future
+        return True
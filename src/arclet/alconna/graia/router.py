@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+from itertools import islice
+
+from arclet.alconna import Alconna, command_manager
+from arclet.alconna.argv import Argv
+from graia.amnesia.message import MessageChain
+
+
+class _Node:
+    __slots__ = ("children", "commands")
+
+    def __init__(self):
+        self.children: dict[str, _Node] = {}
+        self.commands: set[int] = set()
+
+
+class CommandRouter:
+    """
+    命令路由表
+
+    以命令头的字面量 (前缀 + 命令名, 截至首个分隔符) 建立字典树,
+    每条消息只需沿字典树遍历一次首个文本元素即可得知可能匹配的命令.
+
+    命令头不是纯文本 (正则、元素前缀、类型等) 的命令总会被视为候选.
+
+    字典树以命令的哈希为单位索引, 定义相同的多个命令共享同一份索引, 并按引用计数在最后一个命令移除时才移除索引
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._records: dict[int, int] = {}
+        self._refs: dict[int, int] = {}
+        self._nodes: dict[int, list[_Node]] = {}
+        self._wildcards: set[int] = set()
+        self._last: tuple[str | None, set[int]] | None = None
+
+    def add(self, command: Alconna) -> None:
+        """索引一个命令; 命令更新后会被重新索引"""
+        self.remove(command)
+        cmd_hash = command._hash
+        self._records[id(command)] = cmd_hash
+        if (count := self._refs.get(cmd_hash, 0)) > 0:
+            self._refs[cmd_hash] = count + 1
+            return
+        self._refs[cmd_hash] = 1
+        header = command_manager.require(command).command_header
+        if header.flag != 0:
+            self._wildcards.add(cmd_hash)
+            return
+        separators = command.separators
+        nodes = self._nodes[cmd_hash] = []
+        for key in header.content:
+            for index, char in enumerate(key):
+                if char in separators:
+                    key = key[:index]
+                    break
+            node = self._root
+            for char in key:
+                node = node.children.setdefault(char, _Node())
+            node.commands.add(cmd_hash)
+            nodes.append(node)
+        self._last = None
+
+    def remove(self, command: Alconna) -> None:
+        """移除一个命令的索引"""
+        if (cmd_hash := self._records.pop(id(command), None)) is None:
+            return
+        if (count := self._refs.pop(cmd_hash, 0)) > 1:
+            self._refs[cmd_hash] = count - 1
+            return
+        self._wildcards.discard(cmd_hash)
+        for node in self._nodes.pop(cmd_hash, []):
+            node.commands.discard(cmd_hash)
+        self._last = None
+
+    def clear(self):
+        self._root = _Node()
+        self._records.clear()
+        self._refs.clear()
+        self._nodes.clear()
+        self._wildcards.clear()
+        self._last = None
+
+    @staticmethod
+    def head_text(message: MessageChain, argv: Argv, offset: int = 0) -> str | None:
+        """按 Argv 的规则获取消息中自 `offset` 起首个有效元素的文本, 若其不为文本则返回 None"""
+        for unit in islice(message.content, offset, None):
+            if (utype := unit.__class__) in argv.filter_out:
+                continue
+            if (proc := argv.preprocessors.get(utype)) and (res := proc(unit)):
+                unit = res
+            if (text := argv.to_text(unit)) is None:
+                return
+            if text := text.strip():
+                return text
+
+    @staticmethod
+    def message_text(message: MessageChain, argv: Argv) -> str | None:
+        """按 Argv 的规则将整条消息规范化为文本 (各元素以 `\\0` 分隔), 消息中存在非文本元素时返回 None"""
+        texts = []
+        for unit in message.content:
+            if (utype := unit.__class__) in argv.filter_out:
+                continue
+            if (proc := argv.preprocessors.get(utype)) and (res := proc(unit)):
+                unit = res
+            if (text := argv.to_text(unit)) is None:
+                return
+            texts.append(text)
+        return "\0".join(texts).strip()
+
+    def lookup(self, message: MessageChain, argv: Argv, offset: int = 0) -> set[int]:
+        """获取消息首个文本可能匹配的命令
+
+        最近一次首个文本的结果会被缓存, 以便同一事件上的其他调度器直接复用
+        """
+        text = self.head_text(message, argv, offset)
+        if (last := self._last) and last[0] == text:
+            return last[1]
+        node = self._root
+        result = set(node.commands)
+        if text:
+            for char in text:
+                if not (node := node.children.get(char)):  # type: ignore
+                    break
+                result.update(node.commands)
+        self._last = (text, result)
+        return result
+
+    def may_match(self, command: Alconna, message: MessageChain, offset: int = 0) -> bool:
+        """判断命令头是否可能匹配该消息; 返回 False 时命令必然无法匹配
+
+        Args:
+            command (Alconna): 目标命令
+            message (MessageChain): 消息链, 不会被复制或修改
+            offset (int): 跳过消息链开头的元素数量, 例如尚未移除的 At
+        """
+        try:
+            if self._records.get(id(command)) != command._hash:
+                self.add(command)
+            cmd_hash = command._hash
+            if cmd_hash in self._wildcards:
+                return True
+            if not isinstance(getattr(message, "content", None), list):
+                return True
+            if cmd_hash in self.lookup(message, command_manager.resolve(command), offset):
+                return True
+            return bool(command_manager.get_shortcut(command))
+        except ValueError:
+            # 命令已从 command_manager 中移除, 交由解析时的错误处理
+            return True
+
+
+class PrefixTable:
+    """
+    MatchPrefix 共享的前缀分派表
+
+    纯文本前缀建立字典树, 每条消息的首个文本只需遍历一次即可得知命中的全部前缀;
+    元素前缀 (如 `At(...)`) 按元素类型索引.
+    最近一次文本的查询结果会被缓存, 以便同一消息上的其他 MatchPrefix 直接复用
+    """
+
+    def __init__(self):
+        self._root: dict[str, dict] = {}
+        self._literals: dict[str, int] = {}
+        self._elements: dict[int, tuple[type, ...]] = {}
+        self._type_cache: dict[type, frozenset[int]] = {}
+        self._last: tuple[str, set[str]] | None = None
+
+    def add_literal(self, literal: str) -> None:
+        """登记一个纯文本前缀, 同一前缀可被多次登记"""
+        if (count := self._literals.get(literal, 0)) == 0:
+            node = self._root
+            for char in literal:
+                node = node.setdefault(char, {})
+            node[""] = literal
+            self._last = None
+        self._literals[literal] = count + 1
+
+    def remove_literal(self, literal: str) -> None:
+        if (count := self._literals.get(literal, 0)) > 1:
+            self._literals[literal] = count - 1
+            return
+        if self._literals.pop(literal, None) is None:
+            return
+        path = [self._root]
+        for char in literal:
+            path.append(path[-1][char])
+        path[-1].pop("", None)
+        for index in range(len(literal), 0, -1):
+            if path[index]:
+                break
+            path[index - 1].pop(literal[index - 1])
+        self._last = None
+
+    def add_element(self, key: int, types: tuple[type, ...]) -> None:
+        """以 `key` 登记一个元素前缀及其可能匹配的元素类型"""
+        self._elements[key] = types
+        self._type_cache.clear()
+
+    def remove_element(self, key: int) -> None:
+        if self._elements.pop(key, None) is not None:
+            self._type_cache.clear()
+
+    def match_text(self, text: str) -> set[str]:
+        """获取文本命中的全部纯文本前缀"""
+        if (last := self._last) and last[0] == text:
+            return last[1]
+        result = set()
+        node = self._root
+        for char in text:
+            if not (node := node.get(char)):  # type: ignore
+                break
+            if "" in node:
+                result.add(node[""])
+        self._last = (text, result)
+        return result
+
+    def match_element(self, etype: type) -> frozenset[int]:
+        """获取可能匹配该类型元素的元素前缀"""
+        if (result := self._type_cache.get(etype)) is None:
+            result = self._type_cache[etype] = frozenset(
+                key for key, types in self._elements.items() if issubclass(etype, types)
+            )
+        return result
+
+
+prefix_table = PrefixTable()
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from contextlib import suppress
 from dataclasses import dataclass
 from typing import Any 
 
@@ -12,6 +13,7 @@ from graia.saya.cube import Cube
 from graia.saya.schema import BaseSchema
 
 from .dispatcher import AlconnaDispatcher
+from .service import AlconnaGraiaService
 
 
 @dataclass
@@ -25,14 +27,15 @@ class AlconnaSchema(BaseSchema):
         )
 
     def record(self, func: Any):
+        if not (shortcuts := getattr(func, "__alc_shortcuts__", {})):
+            return
         command: Alconna
         if isinstance(self.command, AlconnaDispatcher):
             command = self.command.command
         else:
             command = self.command
-        if shortcuts := getattr(func, "__alc_shortcuts__", {}):
-            for k, v in shortcuts.items():
-                command.shortcut(k, v)
+        for k, v in shortcuts.items():
+            command.shortcut(k, v)
 
 
 class AlconnaBehaviour(Behaviour):
@@ -47,7 +50,7 @@ class AlconnaBehaviour(Behaviour):
         if listener := self.broadcast.getListener(cube.content):
             for dispatcher in listener.dispatchers:
                 if isinstance(dispatcher, AlconnaDispatcher):
-                    cube.metaclass.command = dispatcher.command
+                    cube.metaclass.command = dispatcher if dispatcher.deferred else dispatcher.command
                     cube.metaclass.record(cube.content)
                     return True
             if isinstance(cube.metaclass.command, AlconnaDispatcher):
@@ -62,8 +65,12 @@ class AlconnaBehaviour(Behaviour):
         if not isinstance(cube.metaclass, AlconnaSchema):
             return
         if isinstance(cube.metaclass.command, AlconnaDispatcher):
+            if cube.metaclass.command.deferred:
+                return True
             cmd = cube.metaclass.command.command
         else:
             cmd = cube.metaclass.command
+        with suppress(LookupError):
+            AlconnaGraiaService.current().router.remove(cmd)
         command_manager.delete(cmd)
         return True
@@ -1,15 +1,27 @@
 from __future__ import annotations
 
+import asyncio
 import importlib
 from contextvars import ContextVar
 from contextlib import suppress
+from functools import partial
 from pathlib import Path
-from typing import Generic, Literal, TypeVar
+from time import perf_counter
+from typing import Any, Callable, Generic, Literal, TypeVar
+from graia.broadcast import Broadcast
 from launart import Launart, Service
+from loguru import logger
 from arclet.alconna import command_manager
 
 from .i18n import lang as lang  # type: ignore
 from .adapter import AlconnaGraiaAdapter
+from .cache import command_cache, output_cache, result_cache
+from .instrument import Instrumentation
+from .journal import ShortcutJournal
+from .model import CacheStats, CompletionInfo, SendConfig
+from .pipeline import SendPipeline
+from .router import CommandRouter
+from .session import completion_machine
 
 TAdapter = TypeVar("TAdapter", bound=AlconnaGraiaAdapter)
 
@@ -28,6 +40,18 @@ class AlconnaGraiaService(Service, Generic[TAdapter]):
         cache_dir: str | None = None,
         global_need_tome: bool = False,
         global_remove_tome: bool = False,
+        result_cache_size: int = 1024,
+        result_cache_ttl: float = 60.0,
+        result_wait_timeout: float | None = 30.0,
+        output_cache_size: int = 1024,
+        output_cache_ttl: float = 60.0,
+        instrument: bool = False,
+        cache_commands: bool = False,
+        cache_flush_interval: float = 5.0,
+        cache_compact_threshold: int = 1024,
+        cache_timeout: float | None = 30.0,
+        send_pipeline: SendConfig | None = None,
+        broadcast: Broadcast | None = None,
     ):
         """
         Args:
@@ -36,6 +60,20 @@ class AlconnaGraiaService(Service, Generic[TAdapter]):
             cache_dir (str | None): 保存的路径
             global_need_tome (bool): 是否全局需要 tome
             global_remove_tome (bool): 是否全局移除 tome
+            result_cache_size (int): 解析结果缓存的最大条目数
+            result_cache_ttl (float): 解析结果缓存的存活时间, 单位为秒
+            result_wait_timeout (float | None): 共享同一命令的调度器等待首个调度器解析结果的最长时间, 单位为秒
+            output_cache_size (int): 输出缓存 (帮助信息、快捷指令列表与报错的渲染结果) 的最大条目数
+            output_cache_ttl (float): 输出缓存的存活时间, 单位为秒
+            instrument (bool): 是否启用调度热路径的计时与计数
+            cache_commands (bool): 是否在重启间保存延迟构造命令的命令头表, 使未变化的命令在重启后仍可延迟构造
+            cache_flush_interval (float): 增量写入 shortcuts 变更的间隔, 单位为秒
+            cache_compact_threshold (int): 触发 shortcuts 日志压缩的记录数
+            cache_timeout (float | None): 缓存读写在线程池中的最长等待时间, 单位为秒, 为 None 时不限制
+            send_pipeline (SendConfig | None): 输出信息的限流、去重与合并配置, 不传入则直接发送
+            broadcast (Broadcast | None): 该服务的 adapter 所服务的 Broadcast 实例, 不传入时作为默认 adapter.
+                一个进程中只能创建一个服务: 服务的 id 固定, 且其配置 (缓存、路由等) 是进程全局的;
+                同一进程中运行多个 Broadcast 实例时, 应为其余实例创建 adapter 并调用 `adapter.bind(broadcast)`
         """
         if isinstance(adapter_type, type):
             self.adapter = adapter_type()
@@ -47,10 +85,28 @@ class AlconnaGraiaService(Service, Generic[TAdapter]):
         self.enable_cache = enable_cache
         self.global_need_tome = global_need_tome
         self.global_remove_tome = global_remove_tome
+        self.router = CommandRouter()
+        self.adapter.router = self.router
+        self.adapter.bind(broadcast)
+        if send_pipeline is not None:
+            self.adapter.pipeline = SendPipeline(send_pipeline)
+        self.cache_stats = CacheStats()
+        self.instrumentation = Instrumentation(instrument)
+        result_cache.configure(result_cache_size, result_cache_ttl, self.cache_stats)
+        result_cache.wait_timeout = result_wait_timeout
+        self.output_cache_stats = CacheStats()
+        output_cache.configure(output_cache_size, output_cache_ttl, self.output_cache_stats)
         root = Path(cache_dir) if cache_dir else Path(__file__).parent.parent
         _path = root / "manager_cache.db"
         _path.parent.mkdir(exist_ok=True, parents=True)
         command_manager.cache_path = str(_path.absolute())
+        self.cache_commands = cache_commands
+        self.command_cache_path = root / "command_cache.json"
+        self.cache_flush_interval = cache_flush_interval
+        self.journal = ShortcutJournal(root, cache_compact_threshold)
+        self.cache_timeout = cache_timeout
+        self.cache_timings: dict[str, float] = {}
+        self.completions = completion_machine
         super().__init__()
         CtxService.set(self)
 
@@ -61,21 +117,74 @@ class AlconnaGraiaService(Service, Generic[TAdapter]):
     def get_adapter(self) -> TAdapter:
         return self.adapter
 
+    @property
+    def completion_sessions(self) -> list[CompletionInfo]:
+        """挂起中的补全会话及其已存在的时长"""
+        return self.completions.report()
+
     @property
     def required(self):
         return set()
 
     @property
     def stages(self) -> set[Literal["preparing", "blocking", "cleanup"]]:
+        if self.enable_cache:
+            return {"preparing", "blocking", "cleanup"}
         return {"preparing", "cleanup"}
 
+    async def _offload(self, name: str, func: Callable[[], Any]) -> Any:
+        """
+        在线程池中进行缓存读写, 并记录其耗时; 超时后不再等待, 但已开始的读写仍会在线程中完成
+
+        读写失败只记录日志, 不会中断服务; 未写入的快捷指令变更会在下次写入时重试
+        """
+        start = perf_counter()
+        try:
+            return await asyncio.wait_for(
+                asyncio.get_running_loop().run_in_executor(None, func), self.cache_timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.id}: {name} did not finish within {self.cache_timeout}s")
+        except Exception:
+            logger.exception(f"{self.id}: {name} failed")
+        finally:
+            elapsed = self.cache_timings[name] = perf_counter() - start
+            if self.instrumentation.enabled:
+                self.instrumentation.timing(self.id, name, elapsed)
+            logger.debug(f"{self.id}: {name} took {elapsed * 1e3:.2f}ms")
+
+    async def _sync_cache(self, compact: bool = False):
+        """写入快捷指令的变更; `compact` 为真时 (即退出前) 会先等待进行中的读写完成, 而不是跳过本次写入"""
+        if self.journal.busy:
+            if not compact:
+                return
+            await self._offload("wait", self.journal.wait)
+            if self.journal.busy:
+                logger.warning(f"{self.id}: shortcut journal is still busy, skipping the final flush")
+                return
+        if records := self.journal.collect():
+            await self._offload("flush", partial(self.journal.write, records))
+        if compact or self.journal.should_compact:
+            await self._offload("compact", self.journal.compact)
+
     async def launch(self, manager: Launart):
         async with self.stage("preparing"):
             if self.enable_cache:
-                command_manager.load_cache()
+                await self._offload("recover", self.journal.recover)
+            if self.cache_commands:
+                await self._offload("command_cache.load", partial(command_cache.load, self.command_cache_path))
+        if self.enable_cache:
+            async with self.stage("blocking"):
+                while not manager.status.exiting:
+                    with suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(manager.status.wait_for_sigexit(), self.cache_flush_interval)
+                    await self._sync_cache()
         async with self.stage("cleanup"):
+            self.completions.close()
             if self.enable_cache:
-                command_manager.dump_cache()
+                await self._sync_cache(compact=True)
+            if self.cache_commands:
+                await self._offload("command_cache.dump", partial(command_cache.dump, self.command_cache_path))
 
     supported_interface_types = set()
 
@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+from contextvars import ContextVar
+from time import monotonic
+from typing import Any, Awaitable, Callable
+
+from arclet.alconna import Alconna, Arparma
+from arclet.alconna.completion import CompSession
+from graia.broadcast import Broadcast
+from graia.broadcast.entities.event import Dispatchable
+from graia.broadcast.entities.exectarget import ExecTarget
+from graia.broadcast.entities.listener import Listener
+from graia.broadcast.exceptions import PropagationCancelled
+from graia.broadcast.interrupt.waiter import Waiter
+from graia.broadcast.utilles import dispatcher_mixin_handler
+
+from .model import CompletionInfo
+
+resumed: ContextVar[tuple[Any, Arparma] | None] = ContextVar("alconna_graia_resumed", default=None)
+"""补全完成后重新执行监听器时, 由调度器直接采用的 (命令, 解析结果)"""
+
+
+class CompSessionPool:
+    """
+    按会话来源 (发送者) 隔离的补全会话池
+
+    每个来源同一时间至多持有一个补全会话; 会话数量达到上限, 或同一来源已有会话时不再创建新会话.
+    超过 `idle_timeout` 秒未活动的会话视为已被遗弃, 会在下次创建会话时清理
+    """
+
+    def __init__(self, command: Alconna, max_sessions: int = 64, idle_timeout: float = 120.0):
+        self.command = command
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions: dict[str, tuple[CompSession, float]] = {}
+
+    def _prune(self, now: float):
+        deadline = now - self.idle_timeout
+        for key in [k for k, (_, stamp) in self._sessions.items() if stamp <= deadline]:
+            session, _ = self._sessions.pop(key)
+            session.clear()
+
+    def acquire(self, key: str) -> CompSession | None:
+        """为来源创建补全会话, 无法创建时返回 None"""
+        now = monotonic()
+        self._prune(now)
+        if key in self._sessions or len(self._sessions) >= self.max_sessions:
+            return
+        session = CompSession(self.command)
+        self._sessions[key] = (session, now)
+        return session
+
+    def touch(self, key: str):
+        """刷新来源对应会话的活动时间"""
+        if item := self._sessions.get(key):
+            self._sessions[key] = (item[0], monotonic())
+
+    def release(self, key: str):
+        """结束来源对应的会话"""
+        if item := self._sessions.pop(key, None):
+            item[0].exit()
+
+    def __contains__(self, key: str):
+        return key in self._sessions
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class ParkedSession:
+    """
+    挂起中的补全会话
+
+    会话不持有任何协程: 等待输入期间只保留 `listeners` 中的一次性监听器与超时的定时器,
+    由 `CompletionMachine` 在输入事件到来或超时时调用 `on_input` / `on_timeout` 推进会话
+    """
+
+    __slots__ = (
+        "command", "key", "session", "source", "result", "waiter", "broadcast", "targets", "timeout",
+        "on_input", "on_timeout", "created", "stamp", "busy", "listeners", "timer", "context",
+    )
+
+    def __init__(
+        self,
+        command: Alconna,
+        key: str,
+        session: CompSession,
+        source: Any,
+        result: Arparma,
+        waiter: Waiter,
+        broadcast: Broadcast,
+        targets: list[Listener],
+        timeout: float,
+        on_input: Callable[[ParkedSession, Any], Awaitable[Arparma | None]],
+        on_timeout: Callable[[ParkedSession], Awaitable[Any]],
+        context: contextvars.Context,
+    ):
+        """
+        Args:
+            command (Alconna): 会话所属的命令
+            key (str): 会话来源的标识
+            session (CompSession): 补全会话
+            source (Any): 触发补全的事件
+            result (Arparma): 会话结束时未能完成补全所使用的解析结果
+            waiter (Waiter): 接收用户输入的等待器
+            broadcast (Broadcast): 监听输入事件的 Broadcast 实例
+            targets (list[Listener]): 补全完成后以完成的解析结果重新执行的监听器, 即使用该命令的全部监听器
+            timeout (float): 等待输入的最长时间, 单位为秒
+            on_input: 处理一次输入, 返回补全完成的解析结果, 或 None 以继续等待输入
+            on_timeout: 处理等待输入超时
+            context (contextvars.Context): 进入补全会话 (`with session`) 时的上下文;
+                会话的确认与退出须在其中进行, 超时与补全完成后的处理也在其副本中进行, 如同仍在原监听器中
+        """
+        self.command = command
+        self.key = key
+        self.session = session
+        self.source = source
+        self.result = result
+        self.waiter = waiter
+        self.broadcast = broadcast
+        self.targets = targets
+        self.timeout = timeout
+        self.on_input = on_input
+        self.on_timeout = on_timeout
+        self.created = self.stamp = monotonic()
+        self.busy = False
+        self.listeners: list[Listener] = []
+        self.timer: asyncio.TimerHandle | None = None
+        self.context = context
+
+
+class CompletionMachine:
+    """
+    事件驱动的补全会话状态机
+
+    触发补全的监听器在发送补全提示后即结束, 会话以 `ParkedSession` 的形式挂起:
+    输入事件经由挂起时注册的监听器推进会话, 补全完成时以完成的解析结果重新执行原监听器;
+    会话退出或超时后移除其监听器. 等待中的会话因此不占用任何协程
+    """
+
+    def __init__(self):
+        self._parked: dict[tuple[int, str], ParkedSession] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def _spawn(self, coro: Awaitable[Any], context: contextvars.Context | None = None):
+        loop = asyncio.get_running_loop()
+        # create_task 的 context 参数仅在 3.11+ 可用; 在目标上下文中创建任务, 任务会复制该上下文
+        task = loop.create_task(coro) if context is None else context.run(loop.create_task, coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _arm(self, state: ParkedSession):
+        if state.timer is not None:
+            state.timer.cancel()
+        # 在空白的上下文中调度, 以免定时器经由触发补全的监听器的上下文持有其事件
+        state.timer = asyncio.get_running_loop().call_later(
+            state.timeout, self._expire, state, context=contextvars.Context()
+        )
+
+    def _expire(self, state: ParkedSession):
+        state.timer = None
+        if self._parked.get((id(state.command), state.key)) is state and not state.busy:
+            self.finish(state)
+            self._spawn(state.on_timeout(state), state.context.copy())
+        elif state.busy:
+            self._arm(state)
+
+    def _listener_for(self, state: ParkedSession, event_type: type[Dispatchable]):
+        broadcast = state.broadcast
+        waiter = state.waiter
+
+        async def inside_listener(event: Any):
+            if state.busy or self._parked.get((id(state.command), state.key)) is not state:
+                return
+            ans = await broadcast.Executor(
+                target=ExecTarget(
+                    callable=waiter.detected_event,
+                    inline_dispatchers=waiter.using_dispatchers,
+                    decorators=waiter.using_decorators,
+                ),
+                dispatchers=dispatcher_mixin_handler(event.Dispatcher),
+            )
+            if ans is None or state.busy or self._parked.get((id(state.command), state.key)) is not state:
+                return
+            state.busy = True
+            try:
+                result = await state.on_input(state, ans)
+            finally:
+                state.busy = False
+            if result is not None:
+                self.finish(state)
+                if result.matched:
+                    self.resume(state, result)
+            elif self._parked.get((id(state.command), state.key)) is state:
+                state.stamp = monotonic()
+                self._arm(state)
+            if waiter.block_propagation:
+                raise PropagationCancelled
+
+        inside_listener.__annotations__["event"] = event_type
+        return inside_listener
+
+    def park(self, state: ParkedSession) -> bool:
+        """挂起会话并开始接收输入; 同一命令在同一来源上已有挂起的会话时返回 False"""
+        if (id(state.command), state.key) in self._parked:
+            return False
+        self._parked[(id(state.command), state.key)] = state
+        for event_type in state.waiter.listening_events:
+            callable_ = self._listener_for(state, event_type)
+            state.broadcast.receiver(event_type, priority=state.waiter.priority)(callable_)
+            state.listeners.append(state.broadcast.getListener(callable_))
+        self._arm(state)
+        return True
+
+    def finish(self, state: ParkedSession):
+        """结束会话, 移除其监听器与定时器"""
+        if self._parked.get((id(state.command), state.key)) is state:
+            del self._parked[(id(state.command), state.key)]
+        if state.timer is not None:
+            state.timer.cancel()
+            state.timer = None
+        for listener in state.listeners:
+            if listener in state.broadcast.listeners:
+                state.broadcast.removeListener(listener)
+        state.listeners.clear()
+
+    def resume(self, state: ParkedSession, result: Arparma):
+        """以补全完成的解析结果, 按优先级重新执行使用该命令的全部监听器"""
+        context = state.context.copy()
+        context.run(resumed.set, (state.command, result))
+        self._spawn(state.broadcast.layered_scheduler(state.targets, state.source), context)
+
+    def get(self, command: Alconna, key: str) -> ParkedSession | None:
+        return self._parked.get((id(command), key))
+
+    def report(self) -> list[CompletionInfo]:
+        """获取全部挂起中的会话及其已存在与未活动的时长"""
+        now = monotonic()
+        return [
+            CompletionInfo(state.command.path, state.key, now - state.created, now - state.stamp)
+            for state in self._parked.values()
+        ]
+
+    def close(self):
+        """结束全部会话, 并取消仍在进行的后续处理"""
+        for state in list(self._parked.values()):
+            self.finish(state)
+            state.context.run(state.session.exit)
+        for task in list(self._tasks):
+            task.cancel()
+
+    def __len__(self):
+        return len(self._parked)
+
+
+completion_machine = CompletionMachine()
@@ -2,8 +2,10 @@ from __future__ import annotations
 
 import re
 import inspect
-from functools import lru_cache
+from copy import copy
+from functools import lru_cache, partial
 from typing import Any, Callable, TypedDict
+from weakref import finalize
 
 from arclet.alconna.tools import AlconnaFormat, AlconnaString
 from graia.amnesia.message import Element, MessageChain, Text
@@ -16,12 +18,15 @@ from nepattern import BasePattern, Empty, parser, MatchMode
 from tarina import gen_subclass
 from typing_extensions import NotRequired
 
-from arclet.alconna import Alconna, AllParam
+from arclet.alconna import Alconna, AllParam, config
 from arclet.alconna.tools.construct import FuncMounter, MountConfig
 
 from .adapter import AlconnaGraiaAdapter
+from .cache import CommandCache
 from .dispatcher import AlconnaDispatcher, CommandResult
+from .lazy import LazyCommand, string_heads
 from .model import CompConfig
+from .router import prefix_table
 from .saya import AlconnaSchema
 from .utils import T_Callable
 
@@ -101,6 +106,7 @@ def alcommand(
     comp_session: CompConfig | None = None,
     need_tome: bool = False,
     remove_tome: bool = False,
+    lazy: bool = False,
 ) -> SchemaWrapper:
     """
     saya-util 形式的注册一个消息事件监听器并携带 AlconnaDispatcher
@@ -117,18 +123,24 @@ def alcommand(
         comp_session (CompConfig | None, optional): 是否使用补全会话
         need_tome (bool, optional): 是否需要 @ 机器人
         remove_tome (bool, optional): 是否移除 @ 机器人
+        lazy (bool, optional): 命令为字符串时, 是否延迟到首条可能匹配的消息到来时才构造命令
     """
+    command: Alconna | LazyCommand
     if isinstance(alconna, str):
         if not alconna.strip():
             raise ValueError(alconna)
-        parts = alconna.split(";")
-        _factory = AlconnaString(parts[0])
-        for part in parts[1:]:
-            _head = part.split(" ", 1)[0]
-            _factory.option(_head.lstrip(" ").lstrip("-"), part.lstrip())
-        alconna = _factory.build()
+        if lazy:
+            command = LazyCommand(
+                partial(_build_command, alconna),
+                string_heads(alconna),
+                key=CommandCache.key("alcommand", alconna, config.default_namespace.name),
+            )
+        else:
+            command = _build_command(alconna)
+    else:
+        command = alconna
     dispatcher = AlconnaDispatcher(
-        alconna, send_flag="post" if post else "reply", skip_for_unmatch=not send_error,  # type: ignore
+        command, send_flag="post" if post else "reply", skip_for_unmatch=not send_error,  # type: ignore
         comp_session=comp_session, need_tome=need_tome, remove_tome=remove_tome
     )
 
@@ -136,10 +148,19 @@ def alcommand(
         AlconnaGraiaAdapter.instance().handle_listen(
             func, buffer, dispatcher, guild, private, patterns
         )
-        return AlconnaSchema(dispatcher.command)
+        return AlconnaSchema(dispatcher if dispatcher.deferred else dispatcher.command)
     return wrapper
 
 
+def _build_command(alconna: str) -> Alconna:
+    parts = alconna.split(";")
+    _factory = AlconnaString(parts[0])
+    for part in parts[1:]:
+        _head = part.split(" ", 1)[0]
+        _factory.option(_head.lstrip(" ").lstrip("-"), part.lstrip())
+    return _factory.build()
+
+
 @factory
 def from_command(
     format_command: str,
@@ -198,12 +219,26 @@ def search_element(name: str):
             return i
 
 
-def _get_filter_out() -> list[type[Element]]:
-    res = []
-    for i in ["Source", "Quote", "File"]:
-        if t := search_element(i):
-            res.append(t)
-    return res
+def _get_filter_out() -> tuple[type[Element], ...]:
+    return tuple(t for i in ("Source", "Quote", "File") if (t := search_element(i)))
+
+
+def _rebuild(chain: MessageChain, filter_out: tuple[type[Element], ...], index: int, elem: Element | None):
+    """以 `elem` 替换 (为 None 时移除) 第 `index` 个元素, 并将被过滤的元素前置, 构造新的消息链"""
+    header = []
+    rest = []
+    for i, unit in enumerate(chain.content):
+        if i == index:
+            if elem is not None:
+                rest.append(elem)
+        elif isinstance(unit, filter_out):
+            header.append(unit)
+        else:
+            rest.append(unit)
+    return chain.__class__(header + rest)
+
+
+_REGEX_CHARS = frozenset(".^$*+?{}[]\\|()")
 
 
 def prefixed(pat: BasePattern):
@@ -238,6 +273,17 @@ class MatchPrefix(Decorator, Derive[MessageChain]):
             raise ValueError(prefix)
         self.pattern = prefixed(pattern)
         self.extract = extract
+        self._filter_out = _get_filter_out()
+        self._literal: str | None = None
+        self._element = False
+        if isinstance(prefix, str) and _REGEX_CHARS.isdisjoint(prefix):
+            self._literal = prefix
+            prefix_table.add_literal(prefix)
+            finalize(self, prefix_table.remove_literal, prefix)
+        elif isinstance(prefix, Element) or (isinstance(prefix, type) and issubclass(prefix, Element)):
+            self._element = True
+            prefix_table.add_element(id(self), (prefix if isinstance(prefix, type) else prefix.__class__,))
+            finalize(self, prefix_table.remove_element, id(self))
 
     async def target(self, interface: DecoratorInterface):
         return await self(
@@ -246,21 +292,33 @@ class MatchPrefix(Decorator, Derive[MessageChain]):
         )
 
     async def __call__(self, chain: MessageChain, interface: DispatcherInterface) -> MessageChain:
-        header = chain.include(*_get_filter_out())
-        rest: MessageChain = chain.exclude(*_get_filter_out())
-        if not rest.content:
+        filter_out = self._filter_out
+        for index, elem in enumerate(chain.content):
+            if not isinstance(elem, filter_out):
+                break
+        else:
             raise ExecutionStop
-        elem = rest.content[0]
-        if isinstance(elem, Text) and (res := self.pattern.validate(elem.text)).success:
+        if self._literal is not None:
+            if not isinstance(elem, Text) or self._literal not in prefix_table.match_text(elem.text):
+                raise ExecutionStop
             if self.extract:
-                return MessageChain([Text(str(res.value))])
-            elem.text = elem.text[len(str(res.value)):].lstrip()
-            return header + rest
-        elif self.pattern.validate(elem).success:
+                return MessageChain([Text(self._literal)])
+            stripped = copy(elem)
+            stripped.text = elem.text[len(self._literal):].lstrip()
+            return _rebuild(chain, filter_out, index, stripped)
+        if self._element:
+            if id(self) not in prefix_table.match_element(elem.__class__):
+                raise ExecutionStop
+        elif isinstance(elem, Text) and (res := self.pattern.validate(elem.text)).success:
+            if self.extract:
+                return MessageChain([Text(str(res.value()))])
+            stripped = copy(elem)
+            stripped.text = elem.text[len(str(res.value())):].lstrip()
+            return _rebuild(chain, filter_out, index, stripped)
+        if self.pattern.validate(elem).success:
             if self.extract:
                 return MessageChain([elem])
-            rest.content.remove(elem)
-            return header + rest
+            return _rebuild(chain, filter_out, index, None)
         raise ExecutionStop
 
 
@@ -280,6 +338,7 @@ class MatchSuffix(Decorator, Derive[MessageChain]):
             raise ValueError(suffix)
         self.pattern = suffixed(pattern)
         self.extract = extract
+        self._filter_out = _get_filter_out()
 
     async def target(self, interface: DecoratorInterface):
         return await self(
@@ -288,21 +347,23 @@ class MatchSuffix(Decorator, Derive[MessageChain]):
         )
 
     async def __call__(self, chain: MessageChain, interface: DispatcherInterface) -> MessageChain:
-        header = chain.include(*_get_filter_out())
-        rest: MessageChain = chain.exclude(*_get_filter_out())
-        if not rest.content:
+        filter_out = self._filter_out
+        content = chain.content
+        for index in range(len(content) - 1, -1, -1):
+            if not isinstance(elem := content[index], filter_out):
+                break
+        else:
             raise ExecutionStop
-        elem = rest.content[-1]
         if isinstance(elem, Text) and (res := self.pattern.validate(elem.text)).success:
             if self.extract:
-                return MessageChain([Text(str(res.value))])
-            elem.text = elem.text[: elem.text.rfind(str(res.value))].rstrip()
-            return header + rest
+                return MessageChain([Text(str(res.value()))])
+            stripped = copy(elem)
+            stripped.text = elem.text[: elem.text.rfind(str(res.value()))].rstrip()
+            return _rebuild(chain, filter_out, index, stripped)
         elif self.pattern.validate(elem).success:
             if self.extract:
                 return MessageChain([elem])
-            rest.content.remove(elem)
-            return header + rest
+            return _rebuild(chain, filter_out, index, None)
         raise ExecutionStop
 
 
@@ -11,6 +11,17 @@ from graia.saya.factory import SchemaWrapper, factory
 from typing_extensions import ParamSpec
 
 
+_EVENTS: dict[str, type[Dispatchable]] = {}
+
+
+def _lookup_event(name: str) -> type[Dispatchable]:
+    """按名称获取事件类型; 未命中时重新扫描 Dispatchable 的子类, 以纳入此后定义的事件"""
+    if (event := _EVENTS.get(name)) is None:
+        _EVENTS.update((e.__name__, e) for e in gen_subclass(Dispatchable))
+        event = _EVENTS[name]
+    return event
+
+
 @factory
 def listen(*event: type[Dispatchable] | str) -> SchemaWrapper:
     """在当前 Saya Channel 中监听指定事件
@@ -21,8 +32,7 @@ def listen(*event: type[Dispatchable] | str) -> SchemaWrapper:
     Returns:
         Callable[[T_Callable], T_Callable]: 装饰器
     """
-    EVENTS: dict[str, type[Dispatchable]] = {e.__name__: e for e in gen_subclass(Dispatchable)}
-    events: list[type[Dispatchable]] = [e if isinstance(e, type) else EVENTS[e] for e in event]
+    events: list[type[Dispatchable]] = [e if isinstance(e, type) else _lookup_event(e) for e in event]
 
     def wrapper(func: Callable, buffer: dict[str, Any]) -> ListenerSchema:
         decorator_map: dict[str, Decorator] = buffer.pop("decorator_map", {})
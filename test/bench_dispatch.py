@@ -0,0 +1,259 @@
+"""
+调度热路径的基准测试, 不依赖网络, 以本地的替身事件代替 Ariadne/Avilla 的消息事件
+
+覆盖 AlconnaDispatcher.beforeExecution、catch 注入、MatchPrefix/MatchSuffix、funcommand 与补全会话,
+分别在注册 1、100、1000 个命令时测量吞吐量 (msgs/s) 与 p50/p99 延迟, 结果以 JSON 输出以便跨版本对比
+
+在仓库根目录下运行: PYTHONPATH=. python test/bench_dispatch.py [-o result.json] [-n 200]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+from importlib.metadata import PackageNotFoundError, version
+
+from arclet.alconna import Alconna, Args, Arparma, command_manager, config
+from arclet.alconna.tools.construct import FuncMounter
+from creart import it
+from graia.amnesia.message import MessageChain
+from graia.amnesia.message.element import Text
+from graia.broadcast import Broadcast
+from graia.broadcast.entities.dispatcher import BaseDispatcher
+from graia.broadcast.entities.event import Dispatchable
+from graia.broadcast.exceptions import ExecutionStop
+from graia.broadcast.interfaces.dispatcher import DispatcherInterface
+
+from src.arclet.alconna.graia import (
+    AlconnaDispatcher,
+    AlconnaGraiaService,
+    CommandResult,
+    Header,
+    Match,
+    MatchPrefix,
+    MatchSuffix,
+    Query,
+)
+from src.arclet.alconna.graia.adapter import DefaultAdapter
+
+config.command_max_count = 10 ** 6
+
+
+class BenchMessage(Dispatchable):
+    """替身消息事件"""
+
+    def __init__(self, text: str, sender: str = "bench"):
+        self.message_chain = MessageChain([Text(text)])
+        self.sender = sender
+
+    class Dispatcher(BaseDispatcher):
+        @staticmethod
+        async def catch(interface: DispatcherInterface["BenchMessage"]):
+            if interface.annotation is MessageChain:
+                return interface.event.message_chain
+
+
+class BenchAdapter(DefaultAdapter):
+    """不输出任何内容的 adapter"""
+
+    async def send(self, converter, output_type, output_text, source) -> None:
+        return
+
+
+def summarize(name: str, commands: int, latencies: list) -> dict:
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    return {
+        "scenario": name,
+        "commands": commands,
+        "messages": len(latencies),
+        "msgs_per_sec": round(len(latencies) / total, 2) if total else None,
+        "mean_us": round(statistics.fmean(latencies) * 1e6, 2),
+        "p50_us": round(latencies[len(latencies) // 2] * 1e6, 2),
+        "p99_us": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e6, 2),
+    }
+
+
+def interface_for(bcc: Broadcast, dispatcher) -> DispatcherInterface:
+    return DispatcherInterface(bcc, [*bcc.prelude_dispatchers, BenchMessage.Dispatcher, dispatcher])
+
+
+def messages(count: int, commands: int, template: str = "cmd{index} {value}"):
+    """循环命中各个命令, 每 4 条消息中有 1 条不匹配任何命令"""
+    for i in range(count):
+        if i % 4 == 3:
+            yield f"hello world {i}"
+        else:
+            yield template.format(index=i % commands, value=i)
+
+
+async def bench_before_execution(bcc: Broadcast, dispatchers: list, count: int):
+    latencies = []
+    for text in messages(count, len(dispatchers)):
+        event = BenchMessage(text)
+        with bcc.event_ctx.use(event):
+            start = time.perf_counter()
+            for dispatcher in dispatchers:
+                with contextlib.suppress(ExecutionStop):
+                    await dispatcher.beforeExecution(interface_for(bcc, dispatcher))
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def bench_catch(bcc: Broadcast, dispatchers: list, count: int):
+    async def handler(
+        result: CommandResult,
+        value: Match[int],
+        foo: Match[str],
+        arp: Arparma,
+        header: Header,
+        cmd: Alconna,
+        bar: Query[int] = Query("value"),
+        baz: Query[str] = Query("baz"),
+    ):
+        ...
+
+    target = dispatchers[0]
+    latencies = []
+    for i in range(count):
+        event = BenchMessage(f"cmd0 {i}")
+        with bcc.event_ctx.use(event):
+            start = time.perf_counter()
+            await bcc.Executor(handler, dispatchers=[BenchMessage.Dispatcher, target])
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def bench_match(bcc: Broadcast, decorators: list, count: int, template: str):
+    latencies = []
+    for text in messages(count, len(decorators), template):
+        chain = MessageChain([Text(text)])
+        start = time.perf_counter()
+        for decorator in decorators:
+            with contextlib.suppress(ExecutionStop):
+                await decorator(chain, None)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def bench_funcommand(bcc: Broadcast, wrappers: list, count: int):
+    latencies = []
+    sink = io.StringIO()
+    for text in messages(count, len(wrappers), "fcmd{index} {value}"):
+        event = BenchMessage(text)
+        with bcc.event_ctx.use(event), contextlib.redirect_stdout(sink):
+            start = time.perf_counter()
+            for wrapper in wrappers:
+                await wrapper(interface_for(bcc, None))
+            latencies.append(time.perf_counter() - start)
+        sink.seek(0)
+        sink.truncate()
+    return latencies
+
+
+async def bench_completion(bcc: Broadcast, count: int):
+    """触发补全会话并回答一次, 测量补全完成后监听器被重新执行的往返耗时"""
+    alc = Alconna("bench_comp", Args["foo", int])
+    dispatcher = AlconnaDispatcher(alc, comp_session={"timeout": 5})
+    finished = []
+
+    @bcc.receiver(BenchMessage, dispatchers=[dispatcher])
+    async def handler(result: CommandResult):
+        finished.append(result)
+
+    latencies = []
+    try:
+        for i in range(count):
+            start = time.perf_counter()
+            await bcc.layered_scheduler(
+                bcc.default_listener_generator(BenchMessage), BenchMessage("bench_comp --comp", sender=f"user{i}")
+            )
+            await bcc.layered_scheduler(
+                bcc.default_listener_generator(BenchMessage), BenchMessage(str(i), sender=f"user{i}")
+            )
+            while len(finished) <= i:
+                await asyncio.sleep(0)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        bcc.removeListener(bcc.getListener(handler))
+        command_manager.delete(alc)
+    return latencies
+
+
+async def run(sizes: list, count: int):
+    bcc = it(Broadcast)
+    service = AlconnaGraiaService(BenchAdapter)
+    adapter = service.get_adapter()
+    results = []
+    for size in sizes:
+        commands = [Alconna(f"cmd{i}", Args["value", int]) for i in range(size)]
+        dispatchers = [AlconnaDispatcher(cmd, send_flag="stay") for cmd in commands]
+        prefixes = [MatchPrefix(f"/cmd{i}") for i in range(size)]
+        suffixes = [MatchSuffix(f"cmd{i}") for i in range(size)]
+        mounters = []
+        for i in range(size):
+            def func(value: int):
+                return value
+            func.__name__ = f"fcmd{i}"
+            mounters.append(FuncMounter(func, config={"command": f"fcmd{i}", "raise_exception": False}))
+        wrappers = [adapter.handle_command(mounter) for mounter in mounters]
+        try:
+            results.append(summarize(
+                "beforeExecution", size, await bench_before_execution(bcc, dispatchers, count)
+            ))
+            results.append(summarize("catch", size, await bench_catch(bcc, dispatchers, count)))
+            results.append(summarize("MatchPrefix", size, await bench_match(bcc, prefixes, count, "/cmd{index} {value}")))
+            results.append(summarize("MatchSuffix", size, await bench_match(bcc, suffixes, count, "{value} cmd{index}")))
+            results.append(summarize("funcommand", size, await bench_funcommand(bcc, wrappers, count)))
+            results.append(summarize("completion", size, await bench_completion(bcc, min(count, 50))))
+        finally:
+            for cmd in [*commands, *mounters]:
+                service.router.remove(cmd)
+                command_manager.delete(cmd)
+        for item in results[-6:]:
+            print(
+                f"{item['scenario']:<16}{item['commands']:>6}{item['msgs_per_sec']:>14}"
+                f"{item['p50_us']:>12}{item['p99_us']:>12}",
+                file=sys.stderr,
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-o", "--output", help="JSON 结果的保存路径, 不指定时输出到标准输出")
+    parser.add_argument("-n", "--messages", type=int, default=200, help="每个场景的消息数量")
+    parser.add_argument("-s", "--sizes", type=int, nargs="+", default=[1, 100, 1000], help="注册的命令数量")
+    args = parser.parse_args()
+
+    def _version(name: str):
+        with contextlib.suppress(PackageNotFoundError):
+            return version(name)
+
+    print(f"{'scenario':<16}{'cmds':>6}{'msgs/s':>14}{'p50 (us)':>12}{'p99 (us)':>12}", file=sys.stderr)
+    loop = it(asyncio.AbstractEventLoop)
+    results = loop.run_until_complete(run(args.sizes, args.messages))
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "arclet-alconna": _version("arclet-alconna"),
+            "graia-broadcast": _version("graia-broadcast"),
+            "messages": args.messages,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
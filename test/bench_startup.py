@@ -0,0 +1,166 @@
+"""
+启动耗时的基准测试: 比较 alcommand (字符串形式) 与 alc.command 在立即构造与延迟构造 (lazy=True) 下的插件加载耗时
+
+生成若干个 Saya 插件模块, 每个模块中注册若干条命令, 分别测量全部插件的 require 耗时,
+以及延迟构造下首条命中消息的额外延迟. 结果以 JSON 输出以便跨版本对比
+
+在仓库根目录下运行: PYTHONPATH=. python test/bench_startup.py [-o result.json] [-p 50] [-c 10]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import platform
+import sys
+import tempfile
+import time
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+
+from arclet.alconna import command_manager, config
+from creart import it
+from graia.broadcast import Broadcast
+from graia.saya import Saya
+from graia.saya.builtins.broadcast.behaviour import BroadcastBehaviour
+from loguru import logger
+
+from src.arclet.alconna.graia import AlconnaBehaviour, AlconnaDispatcher, AlconnaGraiaService
+
+config.command_max_count = 10 ** 6
+logger.disable("graia.saya")
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from bench_dispatch import BenchAdapter, BenchMessage, interface_for  # noqa: E402
+
+TEMPLATE = '''
+from arclet.alconna import Args
+from src.arclet.alconna.graia import alc, alcommand, Match
+from src.arclet.alconna.graia.utils import listen
+from bench_dispatch import BenchMessage
+'''
+
+STRING_COMMAND = '''
+
+@listen(BenchMessage)
+@alcommand("[/|!]{name} <foo:int> <bar:str>;--baz <qux:int>", lazy={lazy})
+async def {name}(foo: Match[int]):
+    ...
+'''
+
+FACTORY_COMMAND = '''
+
+@listen(BenchMessage)
+@alc.command("{name}", ["/"], lazy={lazy})
+@alc.main_args(Args["foo", int]["bar", str])
+async def {name}(foo: Match[int]):
+    ...
+'''
+
+
+def generate(root: Path, mode: str, plugins: int, commands: int, lazy: bool) -> list:
+    modules = []
+    for i in range(plugins):
+        name = f"bench_{mode}_{'lazy' if lazy else 'eager'}_{i}"
+        body = [TEMPLATE]
+        for j in range(commands):
+            template = STRING_COMMAND if mode == "alcommand" else FACTORY_COMMAND
+            body.append(template.format(name=f"{name}_cmd{j}", lazy=lazy))
+        (root / f"{name}.py").write_text("".join(body), encoding="utf-8")
+        modules.append(name)
+    return modules
+
+
+async def first_hit(bcc: Broadcast, channel_name: str) -> float:
+    """测量首条命中消息经过全部调度器的耗时"""
+    dispatchers = [
+        dispatcher
+        for listener in bcc.listeners
+        if listener.callable.__module__ == channel_name
+        for dispatcher in listener.dispatchers
+        if isinstance(dispatcher, AlconnaDispatcher)
+    ]
+    cmd_name = f"{channel_name}_cmd0"
+    event = BenchMessage(f"/{cmd_name} 1 a")
+    start = time.perf_counter()
+    with bcc.event_ctx.use(event):
+        for dispatcher in dispatchers:
+            with contextlib.suppress(Exception):
+                await dispatcher.beforeExecution(interface_for(bcc, dispatcher))
+    return time.perf_counter() - start
+
+
+async def run(plugins: int, commands: int):
+    bcc = it(Broadcast)
+    saya = it(Saya)
+    saya.install_behaviours(BroadcastBehaviour(bcc), AlconnaBehaviour(bcc))
+    AlconnaGraiaService(BenchAdapter)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        sys.path.insert(0, tmp)
+        for mode in ("alcommand", "alc.command"):
+            for lazy in (False, True):
+                modules = generate(root, mode.replace(".", "_"), plugins, commands, lazy)
+                count = command_manager.current_count
+                start = time.perf_counter()
+                with saya.module_context():
+                    channels = [saya.require(module) for module in modules]
+                elapsed = time.perf_counter() - start
+                built = command_manager.current_count - count
+                hit = await first_hit(bcc, modules[0])
+                results.append({
+                    "scenario": mode,
+                    "lazy": lazy,
+                    "plugins": plugins,
+                    "commands": plugins * commands,
+                    "load_ms": round(elapsed * 1e3, 2),
+                    "per_command_us": round(elapsed / (plugins * commands) * 1e6, 2),
+                    "built_at_load": built,
+                    "first_hit_us": round(hit * 1e6, 2),
+                })
+                for channel in channels:
+                    saya.uninstall_channel(channel)
+                item = results[-1]
+                print(
+                    f"{item['scenario']:<14}{str(item['lazy']):>6}{item['commands']:>8}{item['load_ms']:>12}"
+                    f"{item['built_at_load']:>8}{item['first_hit_us']:>14}",
+                    file=sys.stderr,
+                )
+        sys.path.remove(tmp)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-o", "--output", help="JSON 结果的保存路径, 不指定时输出到标准输出")
+    parser.add_argument("-p", "--plugins", type=int, default=50, help="生成的插件数量")
+    parser.add_argument("-c", "--commands", type=int, default=10, help="每个插件中的命令数量")
+    args = parser.parse_args()
+
+    def _version(name: str):
+        with contextlib.suppress(PackageNotFoundError):
+            return version(name)
+
+    print(f"{'scenario':<14}{'lazy':>6}{'cmds':>8}{'load (ms)':>12}{'built':>8}{'1st hit (us)':>14}", file=sys.stderr)
+    loop = it(asyncio.AbstractEventLoop)
+    results = loop.run_until_complete(run(args.plugins, args.commands))
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "arclet-alconna": _version("arclet-alconna"),
+            "graia-saya": _version("graia-saya"),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+BaseMessageChainArgv.generate_token 的基准测试, 对比旧的 repr 拼接方式
+
+在仓库根目录下运行: PYTHONPATH=. python test/bench_token.py
+"""
+import timeit
+from pathlib import Path
+
+from graia.amnesia.message.element import Text
+
+from src.arclet.alconna.graia.argv import BaseMessageChainArgv
+
+
+def repr_token(data):
+    return hash(''.join(i.__repr__() for i in data))
+
+
+def avilla_chains():
+    from avilla.core.elements import Notice, Picture
+    from avilla.core.selector import Selector
+
+    member = Selector().land("qq").group("123456").member("654321")
+    return {
+        "avilla-short": ["!echo", "hello"],
+        "avilla-notice": [Notice(member, "bot"), "!jrrp"],
+        "avilla-long": ["!say " + "lorem ipsum " * 40, Notice(member), "tail"],
+        "avilla-image": ["!img", Picture(Path("/tmp/a.png")), Picture(Path("/tmp/b.png")), "caption"],
+    }
+
+
+def ariadne_chains():
+    from graia.ariadne.message.element import At, Image
+
+    return {
+        "ariadne-short": ["!echo", "hello"],
+        "ariadne-at": [At(123456), "!jrrp"],
+        "ariadne-long": ["!say " + "lorem ipsum " * 40, At(123456), "tail"],
+        "ariadne-image": [
+            "!img",
+            Image(id="{01E9451B-70ED-EAE3-B37C-101F1EEBF5B5}.jpg", url="https://example.com/a.jpg"),
+            Image(base64="iVBORw0KGgo" * 512),
+            "caption",
+        ],
+    }
+
+
+def main(number: int = 20000):
+    chains = {"amnesia-text": ["!echo " + "x" * 64, Text("y" * 64)]}
+    for loader in (avilla_chains, ariadne_chains):
+        try:
+            chains.update(loader())
+        except ImportError as e:
+            print(f"skip {loader.__name__}: {e}")
+    print(f"{'chain':<16}{'repr (us)':>12}{'fingerprint (us)':>20}{'speedup':>10}")
+    for name, data in chains.items():
+        old = timeit.timeit(lambda: repr_token(data), number=number) / number * 1e6
+        new = timeit.timeit(lambda: BaseMessageChainArgv.generate_token(data), number=number) / number * 1e6
+        print(f"{name:<16}{old:>12.2f}{new:>20.2f}{old / new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()